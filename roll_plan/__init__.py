@@ -0,0 +1,49 @@
+"""Roll planning simulation for fabric cutplans."""
+from .engine import (
+    DEFAULT_ITERATIONS,
+    FABRIC_ALLOWANCE,
+    Cutplan,
+    IterationResult,
+    SimulationResult,
+    SimulationSummary,
+    classify_end_bits,
+    classify_fixed_lengths,
+    is_fabric_insufficient,
+    rolls_from_columns,
+    run_simulation,
+    resume_iteration,
+    simulate_iteration,
+    summarize,
+    total_fabric_uploaded,
+)
+from .incremental import IncrementalSimulation
+from .inventory import LENGTH_SCALE, RollInventory
+from .profiling import Profiler
+from .solver import solve
+from .stats import RunningStat, StoppingRule, SummaryAccumulator
+
+__all__ = [
+    "DEFAULT_ITERATIONS",
+    "FABRIC_ALLOWANCE",
+    "IncrementalSimulation",
+    "LENGTH_SCALE",
+    "Cutplan",
+    "IterationResult",
+    "Profiler",
+    "RollInventory",
+    "RunningStat",
+    "SimulationResult",
+    "SimulationSummary",
+    "StoppingRule",
+    "SummaryAccumulator",
+    "classify_end_bits",
+    "classify_fixed_lengths",
+    "is_fabric_insufficient",
+    "resume_iteration",
+    "rolls_from_columns",
+    "run_simulation",
+    "simulate_iteration",
+    "solve",
+    "summarize",
+    "total_fabric_uploaded",
+]
@@ -0,0 +1,144 @@
+"""Benchmarks of the simulation on synthetic inputs.
+
+Each case runs one scenario from :mod:`roll_plan.synthetic` in one mode and
+records wall time per iteration and per marker, and peak traced memory.
+Results are written as JSON and can be compared against an earlier file to
+spot regressions:
+
+    python -m roll_plan bench --scenarios small-surplus small-shortage -o bench.json
+    python -m roll_plan bench --compare bench.json
+"""
+import json
+import platform
+import time
+import tracemalloc
+
+from .engine import is_fabric_insufficient, run_simulation, total_fabric_uploaded
+from .synthetic import Scenario, generate_scenario
+
+MODES = ("scalar", "vectorized", "parallel")
+
+DEFAULT_SCENARIOS = ("small-surplus", "small-shortage", "medium-surplus", "medium-shortage")
+
+# A case this much slower than in the baseline is reported as a regression
+DEFAULT_REGRESSION_THRESHOLD = 1.2
+
+
+def _simulate(mode, cutplan, rolls, iterations, seed, workers):
+    if mode == "vectorized":
+        from .vectorized import run_vectorized
+        return run_vectorized(cutplan, rolls, iterations, seed)
+    if mode == "parallel":
+        from .parallel import run_parallel
+        return run_parallel(cutplan, rolls, iterations, seed, workers)
+    return run_simulation(cutplan, rolls, iterations, seed)
+
+
+def run_case(scenario: Scenario, mode="scalar", iterations=20, repeat=3, seed=0,
+             workers=None, measure_memory=True):
+    """Time one scenario in one mode and return a JSON-ready record.
+
+    The fastest of ``repeat`` runs is reported. Peak memory is measured in a
+    separate run because tracing slows allocation-heavy code down; it only
+    covers the current process, so parallel workers are not included.
+    """
+    cutplan, rolls = generate_scenario(scenario)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = _simulate(mode, cutplan, rolls, iterations, seed, workers)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            _simulate(mode, cutplan, rolls, iterations, seed, workers)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    summary = result.summary
+    return {
+        "scenario": scenario.name,
+        "mode": mode,
+        "markers": len(cutplan),
+        "rolls": len(rolls),
+        "fabric_ratio": scenario.fabric_ratio,
+        "insufficient_fabric": is_fabric_insufficient(cutplan, rolls),
+        "fabric_needed": cutplan.total_fabric_needed,
+        "fabric_uploaded": round(total_fabric_uploaded(rolls), 3),
+        "iterations": iterations,
+        "seconds": round(best, 6),
+        "seconds_all_runs": [round(t, 6) for t in timings],
+        "seconds_per_iteration": best / iterations,
+        "seconds_per_marker": best / iterations / len(cutplan),
+        "peak_memory_bytes": peak_memory,
+        "wastage_percentage": summary.wastage_percentage,
+        "avg_shortfall_quantity": summary.avg_shortfall_quantity,
+    }
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+    try:
+        import numpy
+        info["numpy"] = numpy.__version__
+    except ImportError:
+        info["numpy"] = None
+    return info
+
+
+def run_benchmarks(scenarios, modes=("scalar",), iterations=20, repeat=3, seed=0,
+                   workers=None, measure_memory=True, progress=None):
+    """Run every scenario in every mode; ``progress`` is called with each record."""
+    cases = []
+    for scenario in scenarios:
+        for mode in modes:
+            record = run_case(scenario, mode, iterations, repeat, seed, workers, measure_memory)
+            cases.append(record)
+            if progress is not None:
+                progress(record)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "cases": cases,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Pair cases with the baseline's and return ``(case, baseline_case, ratio, regressed)``.
+
+    Cases are matched on scenario, mode, scale and iteration count; ``ratio``
+    is the new time per iteration over the old one.
+    """
+    def key(case):
+        return (case["scenario"], case["mode"], case["markers"], case["rolls"],
+                case["iterations"])
+
+    old_cases = {key(case): case for case in baseline["cases"]}
+    rows = []
+    for case in results["cases"]:
+        old = old_cases.get(key(case))
+        if old is None:
+            continue
+        ratio = case["seconds_per_iteration"] / old["seconds_per_iteration"]
+        rows.append((case, old, ratio, ratio > threshold))
+    return rows
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
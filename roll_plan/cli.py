@@ -0,0 +1,417 @@
+"""Command-line entry point for running roll plans without the app.
+
+    python -m roll_plan run orders/*.xlsx --iterations 5000 --seed 7 --output results.json
+    python -m roll_plan bench --scenarios large-shortage --modes scalar vectorized
+    python -m roll_plan solve order.xlsx --time-budget 30 --output plan.json
+    python -m roll_plan sweep orders/*.xlsx --allowances 0.02 0.05 --orders random best-fit --csv sweep.csv
+    python -m roll_plan compare plan_a.xlsx plan_b.xlsx --sampling antithetic --until-decisive
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict
+
+from .engine import DEFAULT_ITERATIONS, is_fabric_insufficient, run_simulation
+from .profiling import Profiler, phase
+from .stats import StoppingRule
+
+
+def _stopping_rule(args):
+    if (args.wastage_tolerance is None and args.shortfall_tolerance is None
+            and args.time_budget is None):
+        return None
+    return StoppingRule(args.wastage_tolerance, args.shortfall_tolerance,
+                        args.time_budget, args.min_iterations)
+
+
+def _simulate(args, cutplan, rolls, stopping, profiler=None):
+    if args.workers != 1:
+        from .parallel import run_parallel
+        return run_parallel(cutplan, rolls, args.iterations, args.seed, args.workers or None,
+                            args.vectorized, args.batch_size, stopping)
+    if args.vectorized:
+        from .vectorized import DEFAULT_BATCH_SIZE, run_vectorized
+        return run_vectorized(cutplan, rolls, args.iterations, args.seed,
+                              args.batch_size or DEFAULT_BATCH_SIZE, stopping)
+    return run_simulation(cutplan, rolls, args.iterations, args.seed, stopping=stopping,
+                          profiler=profiler)
+
+
+def _run(args):
+    # The workbook reader pulls in pandas, so only import it when needed
+    from .ingest import CutplanError, load_inputs
+
+    stopping = _stopping_rule(args)
+    results = []
+    failed = False
+    for path in args.workbooks:
+        profiler = Profiler() if args.profile else None
+        try:
+            with phase(profiler, "read_input"):
+                cutplan, rolls = load_inputs(path, args.cache_dir)
+        except (CutplanError, KeyError, ValueError, OSError) as exc:
+            print(f"{path}: error: {exc}", file=sys.stderr)
+            failed = True
+            continue
+
+        started = time.perf_counter()
+        result = _simulate(args, cutplan, rolls, stopping, profiler)
+        elapsed = time.perf_counter() - started
+        summary = result.summary
+
+        insufficient = is_fabric_insufficient(cutplan, rolls)
+        print(f"{path}: {summary.num_iterations} iterations in {elapsed:.2f}s"
+              + (f" ({result.stop_reason})" if result.stop_reason else "")
+              + f", wastage {summary.wastage_percentage}% ± {summary.wastage_percentage_margin}"
+              f", shortfall {summary.avg_shortfall_quantity} ± {summary.shortfall_quantity_margin} garments"
+              + (" (insufficient fabric)" if insufficient else ""))
+        if profiler is not None:
+            print("  " + ", ".join(f"{row['Phase']} {row['Total (ms)']:.1f} ms"
+                                   for row in profiler.phase_table() if row["Calls"]))
+        results.append({
+            "workbook": str(path),
+            "seed": args.seed,
+            "insufficient_fabric": insufficient,
+            "elapsed_seconds": round(elapsed, 3),
+            "stop_reason": result.stop_reason,
+            "summary": asdict(summary),
+            "end_bits_table": summary.end_bits_table(),
+            "stats": result.stats.describe(),
+        })
+        if profiler is not None:
+            results[-1]["profile"] = profiler.report()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+def _solve(args):
+    from .ingest import CutplanError, load_inputs
+    from .solver import compare_with_random, solve
+
+    try:
+        cutplan, rolls = load_inputs(args.workbook, args.cache_dir)
+    except (CutplanError, KeyError, ValueError, OSError) as exc:
+        print(f"{args.workbook}: error: {exc}", file=sys.stderr)
+        return 1
+
+    solution = solve(cutplan, rolls, args.time_budget, args.seed)
+    best = solution.result
+    print(f"{args.workbook}: best of {solution.evaluations} plans in {solution.elapsed:.1f}s: "
+          f"shortfall {best.shortfall_quantity} garments, unusable bits {best.unusable_bits}, "
+          f"usable end bits {best.usable_end_bits}"
+          + (" (insufficient fabric)" if is_fabric_insufficient(cutplan, rolls) else ""))
+    if not args.no_compare:
+        comparison = compare_with_random(solution, rolls, args.compare_budget, seed=args.seed)
+        print(f"  {comparison.iterations} random plans in {comparison.elapsed:.1f}s: "
+              f"mean shortfall {comparison.mean_shortfall_quantity}, "
+              f"mean unusable bits {comparison.mean_unusable_bits}; best random plan "
+              f"{comparison.best_shortfall_quantity} short, {comparison.best_unusable_bits} unusable; "
+              f"{comparison.worse_share:.0%} of random plans are worse")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "workbook": str(args.workbook),
+                "seed": args.seed,
+                "seed_heuristic": solution.seed_heuristic,
+                "evaluations": solution.evaluations,
+                "elapsed_seconds": round(solution.elapsed, 3),
+                "result": asdict(best),
+                "seed_result": asdict(solution.seed_result),
+                "comparison": asdict(solution.comparison) if solution.comparison else None,
+                "plan": solution.plan_table(),
+            }, f, indent=2)
+    return 0
+
+
+def _sweep(args):
+    import csv
+
+    from .ingest import CutplanError, load_inputs
+    from .sweep import COLUMNS, run_sweep
+
+    inputs = {}
+    failed = False
+    for path in args.workbooks:
+        try:
+            inputs[str(path)] = load_inputs(path, args.cache_dir)
+        except (CutplanError, KeyError, ValueError, OSError) as exc:
+            print(f"{path}: error: {exc}", file=sys.stderr)
+            failed = True
+
+    csv_file = open(args.csv, "w", newline="") if args.csv else None
+    writer = csv.DictWriter(csv_file, COLUMNS) if csv_file else None
+    if writer:
+        writer.writeheader()
+
+    def report(row):
+        print(f"{row['input']} [{row['order']}, trim {row['trim']:g}, "
+              f"allowance {row['allowance']:g}]: wastage {row['wastage_percentage']}%, "
+              f"shortfall {row['avg_shortfall_quantity']} garments"
+              + (" (insufficient fabric)" if row["insufficient_fabric"] else "")
+              + (" (cached)" if row["cached"] else ""))
+        if writer:
+            writer.writerow(row)
+            csv_file.flush()
+
+    try:
+        rows = run_sweep(inputs, args.allowances, args.orders, args.trims, args.iterations,
+                         args.seed, args.workers or None, args.results_cache, report)
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 1 if failed else 0
+
+
+def _compare(args):
+    from .compare import compare_cutplans
+    from .ingest import CutplanError, load_inputs
+
+    cutplans = {}
+    rolls = None
+    for path in ([args.rolls] if args.rolls else []) + args.workbooks:
+        try:
+            cutplan, input_rolls = load_inputs(path, args.cache_dir)
+        except (CutplanError, KeyError, ValueError, OSError) as exc:
+            print(f"{path}: error: {exc}", file=sys.stderr)
+            return 1
+        if rolls is None:
+            rolls = input_rolls
+        if path is not args.rolls:
+            cutplans[str(path)] = cutplan
+
+    comparison = compare_cutplans(cutplans, rolls, args.iterations, args.seed, args.sampling,
+                                  args.strata, stop_when_decisive=args.until_decisive)
+    print(f"{comparison.iterations} iterations ({comparison.sampling}) in "
+          f"{comparison.elapsed:.2f}s" + (f" ({comparison.stop_reason})"
+                                          if comparison.stop_reason else ""))
+    for name, wastage in comparison.wastage_percentage.items():
+        print(f"{name}: wastage {wastage}% ± {comparison.wastage_percentage_margin[name]}, "
+              f"shortfall {comparison.avg_shortfall_quantity[name]} garments")
+    for difference in comparison.differences:
+        print(f"{difference.name} vs {difference.baseline}: wastage "
+              f"{difference.wastage_percentage:+} ± {difference.wastage_percentage_margin} points "
+              f"(± {difference.unpaired_wastage_percentage_margin} unpaired), shortfall "
+              f"{difference.shortfall_quantity:+} ± {difference.shortfall_quantity_margin}"
+              + (" (decisive)" if difference.decisive else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            result = asdict(comparison)
+            for difference, record in zip(comparison.differences, result["differences"]):
+                record["decisive"] = difference.decisive
+            json.dump(result, f, indent=2)
+    return 0
+
+
+def _scenarios(args):
+    from .synthetic import scenario_from_args
+    return [scenario_from_args(name, args.markers, args.rolls, args.fabric_ratio, args.seed)
+            for name in args.scenarios]
+
+
+def _bench(args):
+    from .bench import compare, load_results, run_benchmarks, write_results
+
+    def report(case):
+        memory = case["peak_memory_bytes"]
+        print(f"{case['scenario']} [{case['mode']}] {case['markers']} markers, "
+              f"{case['rolls']} rolls"
+              + (" (insufficient fabric)" if case["insufficient_fabric"] else "")
+              + f": {case['seconds_per_iteration'] * 1000:.2f} ms/iteration, "
+              f"{case['seconds_per_marker'] * 1e6:.1f} µs/marker"
+              + (f", peak {memory / 2**20:.1f} MiB" if memory is not None else ""))
+
+    results = run_benchmarks(_scenarios(args), args.modes, args.iterations, args.repeat,
+                             args.seed or 0, args.workers or None, not args.no_memory, report)
+    if args.output:
+        write_results(results, args.output)
+
+    if not args.compare:
+        return 0
+    regressed = False
+    for case, old, ratio, slower in compare(results, load_results(args.compare), args.threshold):
+        print(f"{case['scenario']} [{case['mode']}]: {ratio:.2f}x baseline"
+              + (" REGRESSION" if slower else ""))
+        regressed = regressed or slower
+    return 1 if regressed else 0
+
+
+def _generate(args):
+    from .synthetic import generate_scenario, write_tables
+    for scenario in _scenarios(args):
+        directory = f"{args.directory}/{scenario.name}"
+        write_tables(*generate_scenario(scenario), directory, args.format)
+        print(f"{directory}: {scenario.num_markers} markers, {scenario.num_rolls} rolls")
+    return 0
+
+
+def _add_scenario_arguments(parser, default):
+    from .synthetic import SCENARIOS
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=default,
+                        metavar="SCENARIO",
+                        help=f"synthetic scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--markers", type=int, default=None, help="override the number of markers")
+    parser.add_argument("--rolls", type=int, default=None, help="override the number of rolls")
+    parser.add_argument("--fabric-ratio", type=float, default=None,
+                        help="override fabric uploaded over fabric needed "
+                             "(below 1.02 is a shortage)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the inputs and the runs")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="roll_plan", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="simulate random roll plans for workbooks")
+    run.add_argument("workbooks", nargs="+",
+                     help="Excel files with cutplan and rolls_data sheets, or directories "
+                          "with cutplan and rolls_data tables as CSV or Parquet files")
+    run.add_argument("--cache-dir", default=None,
+                     help="cache parsed inputs as Parquet in this directory "
+                          "(default $ROLL_PLAN_CACHE_DIR)")
+    run.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS,
+                     help=f"random roll plans per workbook (default {DEFAULT_ITERATIONS})")
+    run.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    run.add_argument("--vectorized", action="store_true",
+                     help="advance batches of iterations together with NumPy")
+    run.add_argument("--batch-size", type=int, default=None,
+                     help="iterations per batch for vectorized or parallel runs")
+    run.add_argument("-j", "--workers", type=int, default=1,
+                     help="worker processes, 0 for one per CPU (default 1)")
+    adaptive = run.add_argument_group(
+        "adaptive runs", "stop before --iterations once the 95% confidence intervals are "
+        "narrower than the tolerances given, or the time budget is spent")
+    adaptive.add_argument("--wastage-tolerance", type=float, default=None,
+                          help="half-width on wastage %%, in percentage points")
+    adaptive.add_argument("--shortfall-tolerance", type=float, default=None,
+                          help="half-width on shortfall quantity, in garments")
+    adaptive.add_argument("--time-budget", type=float, default=None,
+                          help="seconds to spend per workbook")
+    adaptive.add_argument("--min-iterations", type=int, default=10,
+                          help="iterations to run before checking tolerances (default 10)")
+    run.add_argument("--profile", action="store_true",
+                     help="time each phase and marker and add the report to the JSON output "
+                          "(not with --vectorized or --workers)")
+    run.add_argument("-o", "--output", help="write the summaries to this JSON file")
+    run.set_defaults(func=_run)
+
+    from .solver import DEFAULT_TIME_BUDGET
+    solve = subparsers.add_parser(
+        "solve", help="search for the roll plan with the least shortfall and unusable fabric")
+    solve.add_argument("workbook", help="Excel file, or directory of CSV or Parquet tables")
+    solve.add_argument("--cache-dir", default=None,
+                       help="cache parsed inputs as Parquet in this directory "
+                            "(default $ROLL_PLAN_CACHE_DIR)")
+    solve.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET,
+                       help=f"seconds to search for (default {DEFAULT_TIME_BUDGET:g})")
+    solve.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    solve.add_argument("--compare-budget", type=float, default=None,
+                       help="seconds to sample random plans for comparison "
+                            "(default the same as the search)")
+    solve.add_argument("--no-compare", action="store_true",
+                       help="skip the comparison with random plans")
+    solve.add_argument("-o", "--output", help="write the plan and its figures to this JSON file")
+    solve.set_defaults(func=_solve)
+
+    from .engine import FABRIC_ALLOWANCE
+    from .sweep import ORDER_POLICIES
+    sweep = subparsers.add_parser(
+        "sweep", help="simulate workbooks under every combination of allowance, roll order "
+                      "and inventory trim")
+    sweep.add_argument("workbooks", nargs="+",
+                       help="Excel files, or directories of CSV or Parquet tables")
+    sweep.add_argument("--cache-dir", default=None,
+                       help="cache parsed inputs as Parquet in this directory "
+                            "(default $ROLL_PLAN_CACHE_DIR)")
+    sweep.add_argument("--allowances", nargs="+", type=float, default=[FABRIC_ALLOWANCE],
+                       help=f"fabric allowances for the shortage warning, as fractions "
+                            f"(default {FABRIC_ALLOWANCE})")
+    sweep.add_argument("--orders", nargs="+", choices=ORDER_POLICIES, default=["random"],
+                       help="roll order policies (default random)")
+    sweep.add_argument("--trims", nargs="+", type=float, default=[0.0],
+                       help="shares of the shortest rolls to leave out (default 0)")
+    sweep.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS,
+                       help=f"random roll plans per combination (default {DEFAULT_ITERATIONS})")
+    sweep.add_argument("--seed", type=int, default=0,
+                       help="random seed shared by every combination (default 0)")
+    sweep.add_argument("-j", "--workers", type=int, default=0,
+                       help="worker processes, 0 for one per CPU (default 0)")
+    sweep.add_argument("--results-cache", default=None, metavar="DIR",
+                       help="reuse and store simulation results in this directory")
+    sweep.add_argument("--csv", help="append rows to this CSV file as they finish")
+    sweep.add_argument("-o", "--output", help="write the table, in grid order, to this JSON file")
+    sweep.set_defaults(func=_sweep)
+
+    from .compare import DEFAULT_STRATA, SAMPLING
+    compare = subparsers.add_parser(
+        "compare", help="compare cutplans on the same random roll orders")
+    compare.add_argument("workbooks", nargs="+",
+                         help="inputs whose cutplans to compare, the first being the baseline")
+    compare.add_argument("--rolls", default=None, metavar="INPUT",
+                         help="take the rolls from this input (default the first workbook's)")
+    compare.add_argument("--cache-dir", default=None,
+                         help="cache parsed inputs as Parquet in this directory "
+                              "(default $ROLL_PLAN_CACHE_DIR)")
+    compare.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS,
+                         help=f"iterations per cutplan (default {DEFAULT_ITERATIONS})")
+    compare.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    compare.add_argument("--sampling", choices=SAMPLING, default="independent",
+                         help="how roll orders are drawn (default independent)")
+    compare.add_argument("--strata", type=int, default=DEFAULT_STRATA,
+                         help=f"iterations per block for stratified sampling "
+                              f"(default {DEFAULT_STRATA})")
+    compare.add_argument("--until-decisive", action="store_true",
+                         help="stop before --iterations once every wastage difference's "
+                              "confidence interval excludes zero")
+    compare.add_argument("-o", "--output", help="write the comparison to this JSON file")
+    compare.set_defaults(func=_compare)
+
+    from .bench import DEFAULT_REGRESSION_THRESHOLD, DEFAULT_SCENARIOS, MODES
+    bench = subparsers.add_parser("bench", help="time the simulation on synthetic inputs")
+    _add_scenario_arguments(bench, list(DEFAULT_SCENARIOS))
+    bench.add_argument("--modes", nargs="+", choices=MODES, default=["scalar"],
+                       help="simulation modes to time (default scalar)")
+    bench.add_argument("-n", "--iterations", type=int, default=20,
+                       help="iterations per timed run (default 20)")
+    bench.add_argument("--repeat", type=int, default=3,
+                       help="timed runs per case, the fastest is reported (default 3)")
+    bench.add_argument("-j", "--workers", type=int, default=0,
+                       help="worker processes for the parallel mode, 0 for one per CPU")
+    bench.add_argument("--no-memory", action="store_true",
+                       help="skip the extra run that measures peak memory")
+    bench.add_argument("-o", "--output", help="write the results to this JSON file")
+    bench.add_argument("--compare", metavar="BASELINE",
+                       help="compare against an earlier results file and exit with "
+                            "status 1 on a regression")
+    bench.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                       help="slowdown ratio counted as a regression "
+                            f"(default {DEFAULT_REGRESSION_THRESHOLD})")
+    bench.set_defaults(func=_bench)
+
+    generate = subparsers.add_parser(
+        "generate", help="write synthetic cutplan and rolls_data tables for a scenario")
+    _add_scenario_arguments(generate, ["medium-surplus", "medium-shortage"])
+    generate.add_argument("directory", help="write one subdirectory per scenario here")
+    generate.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    generate.set_defaults(func=_generate)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "profile", False) and (args.vectorized or args.workers != 1):
+        parser.error("--profile only works with the default single-process mode")
+    if args.command == "compare" and len(args.workbooks) < 2:
+        parser.error("compare needs at least two workbooks")
+    return args.func(args)
@@ -0,0 +1,238 @@
+"""Comparing cutplans on common random numbers.
+
+Running each cutplan with its own random roll plans buries the difference
+between them in the spread of the plans. :func:`compare_cutplans` runs every
+cutplan on the same roll orders instead: at the k-th marker, iteration i
+orders the regular rolls by the same random keys whichever cutplan is being
+laid (see :func:`roll_plan.incremental.keyed_shuffle`). It reports the
+difference from a baseline cutplan with a confidence interval taken over
+the per-iteration differences. The luck of the draw largely cancels out of
+these, so far fewer iterations separate two cutplans.
+
+The keys can also be drawn in blocks of iterations:
+
+* ``antithetic``: pairs of iterations, the second trying the rolls in the
+  reverse order of the first;
+* ``stratified``: blocks of ``strata`` iterations that each rotate the same
+  order by ``1 / strata`` of its length, so each roll's key falls once in
+  each of ``strata`` equal bands and every roll is tried early and late
+  equally often.
+
+Iterations in a block are not independent, so confidence intervals are
+taken over block means.
+"""
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from .engine import DEFAULT_ITERATIONS, Cutplan, Roll, simulate_iteration
+from .incremental import keyed_shuffle
+from .inventory import RollInventory
+from .stats import DEFAULT_CONFIDENCE, RunningStat
+
+SAMPLING = ("independent", "antithetic", "stratified")
+
+DEFAULT_STRATA = 4
+
+# Blocks to run before stopping early once every difference is decisive
+DEFAULT_MIN_SAMPLES = 10
+
+# Precision of the running totals of wastage % and shortfall quantity means
+_PERCENT_SCALE = 10**6
+_QUANTITY_SCALE = 10**3
+
+
+def block_size(sampling: str, strata: int = DEFAULT_STRATA):
+    """Iterations per block of the sampling scheme."""
+    if sampling == "independent":
+        return 1
+    if sampling == "antithetic":
+        return 2
+    if sampling == "stratified":
+        if strata < 2:
+            raise ValueError(f"Stratified sampling needs at least 2 strata, got {strata}")
+        return strata
+    raise ValueError(f"Unknown sampling {sampling!r}, expected one of {', '.join(SAMPLING)}")
+
+
+def sampled_shuffle(seed: int, iteration: int, num_rolls: int, sampling: str = "independent",
+                    strata: int = DEFAULT_STRATA):
+    """Shuffle hook for ``iteration`` under a sampling scheme.
+
+    Like :func:`roll_plan.incremental.keyed_shuffle`, the order at a marker
+    only depends on the seed, the iteration and the marker's position.
+    """
+    size = block_size(sampling, strata)
+    if size == 1:
+        return keyed_shuffle(seed, iteration, num_rolls)
+    block, position = divmod(iteration, size)
+    base = ((seed % 2**64) << 64) | (block << 32)
+
+    if sampling == "antithetic":
+        def shuffle(roll_ids, marker_index):
+            next_key = random.Random(base | marker_index).random
+            keys = [next_key() for _ in range(num_rolls)]
+            # Keys of 1 - u order the rolls in reverse
+            roll_ids.sort(key=keys.__getitem__, reverse=position == 1)
+        return shuffle
+
+    def shuffle(roll_ids, marker_index):
+        # Shifting every key by 1/strata each iteration, wrapping round,
+        # rotates the order by that share of its length
+        next_key = random.Random(base | marker_index).random
+        shift = position / strata
+        keys = [(next_key() + shift) % 1 for _ in range(num_rolls)]
+        roll_ids.sort(key=keys.__getitem__)
+    return shuffle
+
+
+@dataclass
+class PairedDifference:
+    """How much a cutplan differs from the baseline, on the same roll orders."""
+
+    name: str
+    baseline: str
+    # Mean differences (cutplan minus baseline) and their confidence half-widths
+    wastage_percentage: float
+    wastage_percentage_margin: float
+    shortfall_quantity: float
+    shortfall_quantity_margin: float
+    # Half-width the wastage difference would have without pairing the
+    # iterations, as when each cutplan is run on its own
+    unpaired_wastage_percentage_margin: float
+
+    @property
+    def decisive(self):
+        """True when the confidence interval on the wastage difference excludes zero."""
+        return abs(self.wastage_percentage) > self.wastage_percentage_margin
+
+
+@dataclass
+class CutplanComparison:
+    """Wastage and shortfall of several cutplans run on common roll orders."""
+
+    baseline: str
+    sampling: str
+    seed: int
+    iterations: int
+    # Independent samples the confidence intervals are taken over: blocks
+    samples: int
+    elapsed: float
+    wastage_percentage: Dict[str, float]
+    wastage_percentage_margin: Dict[str, float]
+    avg_shortfall_quantity: Dict[str, float]
+    differences: List[PairedDifference]
+    # "decisive" when stopped early because every difference was, else None
+    stop_reason: Optional[str] = None
+
+    def table(self):
+        """Rows of cutplan figures and their differences from the baseline."""
+        differences = {difference.name: difference for difference in self.differences}
+        rows = []
+        for name, wastage in self.wastage_percentage.items():
+            difference = differences.get(name)
+            rows.append({
+                "Cutplan": name,
+                "Wastage %": wastage,
+                "Wastage % ±": self.wastage_percentage_margin[name],
+                "Avg. Shortfall Quantity": self.avg_shortfall_quantity[name],
+                "Wastage % vs Baseline": difference.wastage_percentage if difference else None,
+                "Paired ±": difference.wastage_percentage_margin if difference else None,
+                "Unpaired ±": difference.unpaired_wastage_percentage_margin if difference else None,
+                "Shortfall vs Baseline": difference.shortfall_quantity if difference else None,
+                "Shortfall ±": difference.shortfall_quantity_margin if difference else None,
+                "Decisive": difference.decisive if difference else None,
+            })
+        return rows
+
+
+def compare_cutplans(cutplans: Mapping[str, Cutplan], rolls: Sequence[Roll],
+                     num_iterations: int = DEFAULT_ITERATIONS, seed: Optional[int] = None,
+                     sampling: str = "independent", strata: int = DEFAULT_STRATA,
+                     baseline: Optional[str] = None, confidence: float = DEFAULT_CONFIDENCE,
+                     stop_when_decisive: bool = False,
+                     min_samples: int = DEFAULT_MIN_SAMPLES) -> CutplanComparison:
+    """Run every cutplan on the same random roll orders and compare them.
+
+    ``cutplans`` maps names to two or more cutplans; differences are taken from
+    ``baseline``, by default the first. ``num_iterations`` is rounded up to
+    whole blocks of the ``sampling`` scheme. With ``stop_when_decisive`` the
+    run ends once at least ``min_samples`` blocks have been run and every
+    wastage difference is decisive.
+    """
+    names = list(cutplans)
+    if len(names) < 2:
+        raise ValueError("Comparing needs at least two cutplans")
+    if baseline is None:
+        baseline = names[0]
+    if baseline not in cutplans:
+        raise ValueError(f"No cutplan named {baseline!r} to compare against")
+    if seed is None:
+        seed = random.getrandbits(64)
+    size = block_size(sampling, strata)
+    num_blocks = -(-num_iterations // size)
+
+    inventory = RollInventory.from_rolls(rolls)
+    wastage = {name: RunningStat(_PERCENT_SCALE) for name in names}
+    shortfall = {name: RunningStat(_QUANTITY_SCALE) for name in names}
+    wastage_differences = {name: RunningStat(_PERCENT_SCALE) for name in names if name != baseline}
+    shortfall_differences = {name: RunningStat(_QUANTITY_SCALE) for name in wastage_differences}
+
+    def differences():
+        return [PairedDifference(
+            name=name,
+            baseline=baseline,
+            wastage_percentage=round(stat.mean, 4),
+            wastage_percentage_margin=round(stat.margin(confidence), 4),
+            shortfall_quantity=round(shortfall_differences[name].mean, 2),
+            shortfall_quantity_margin=round(shortfall_differences[name].margin(confidence), 2),
+            unpaired_wastage_percentage_margin=round(
+                math.hypot(wastage[name].margin(confidence),
+                           wastage[baseline].margin(confidence)), 4),
+        ) for name, stat in wastage_differences.items()]
+
+    stop_reason = None
+    started = time.perf_counter()
+    for block in range(num_blocks):
+        block_wastage = dict.fromkeys(names, 0.0)
+        block_shortfall = dict.fromkeys(names, 0)
+        for position in range(size):
+            shuffle = sampled_shuffle(seed, block * size + position, inventory.num_rolls,
+                                      sampling, strata)
+            for name in names:
+                cutplan = cutplans[name]
+                result = simulate_iteration(cutplan, inventory, shuffle=shuffle)
+                block_wastage[name] += ((result.usable_end_bits + result.unusable_bits)
+                                        / cutplan.total_fabric_needed * 100)
+                block_shortfall[name] += result.shortfall_quantity
+
+        for name in names:
+            wastage[name].add(block_wastage[name] / size)
+            shortfall[name].add(block_shortfall[name] / size)
+        for name in wastage_differences:
+            wastage_differences[name].add((block_wastage[name] - block_wastage[baseline]) / size)
+            shortfall_differences[name].add(
+                (block_shortfall[name] - block_shortfall[baseline]) / size)
+
+        if (stop_when_decisive and block + 1 >= min_samples
+                and all(difference.decisive for difference in differences())):
+            stop_reason = "decisive"
+            break
+
+    samples = wastage[baseline].count
+    return CutplanComparison(
+        baseline=baseline,
+        sampling=sampling,
+        seed=seed,
+        iterations=samples * size,
+        samples=samples,
+        elapsed=time.perf_counter() - started,
+        wastage_percentage={name: round(stat.mean, 3) for name, stat in wastage.items()},
+        wastage_percentage_margin={name: round(stat.margin(confidence), 3)
+                                   for name, stat in wastage.items()},
+        avg_shortfall_quantity={name: round(stat.mean, 1) for name, stat in shortfall.items()},
+        differences=differences(),
+        stop_reason=stop_reason,
+    )
@@ -0,0 +1,500 @@
+"""Headless roll-plan simulation engine.
+
+This is the marker/roll allocation loop of the Streamlit app, with no UI or
+spreadsheet dependencies, so it can be driven from batch jobs as well as the
+app itself.
+"""
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .inventory import LengthIndex, RollIndex, RollInventory, from_fixed, to_fixed
+from .profiling import Profiler, phase
+from .stats import DEFAULT_CONFIDENCE, StoppingRule, SummaryAccumulator
+
+# Allowance added to the fabric requirement for the shortage warning
+FABRIC_ALLOWANCE = 0.02
+
+# Number of random roll plans the app runs by default
+DEFAULT_ITERATIONS = 50
+
+# A roll is a (roll name, roll length) pair
+Roll = Tuple[object, float]
+
+
+@dataclass(frozen=True)
+class Cutplan:
+    """Markers of a cutplan, in the order they are laid."""
+
+    marker_names: Tuple
+    marker_lengths: Tuple[float, ...]
+    ply_heights: Tuple[int, ...]
+    bundles: Tuple[int, ...]
+
+    @classmethod
+    def from_columns(cls, marker_names, marker_lengths, ply_heights, bundles):
+        return cls(
+            tuple(marker_names),
+            tuple(float(length) for length in marker_lengths),
+            tuple(int(plies) for plies in ply_heights),
+            tuple(int(count) for count in bundles),
+        )
+
+    def __len__(self):
+        return len(self.marker_lengths)
+
+    @property
+    def total_fabric_needed(self):
+        return round(sum(length * plies for length, plies
+                         in zip(self.marker_lengths, self.ply_heights)), 3)
+
+    @property
+    def total_fabric_needed_with_allowance(self):
+        return self.total_fabric_needed * (1 + FABRIC_ALLOWANCE)
+
+    @property
+    def total_garments(self):
+        return sum(count * plies for count, plies in zip(self.bundles, self.ply_heights))
+
+    @property
+    def total_plies(self):
+        return sum(self.ply_heights)
+
+    @property
+    def estimated_yield_per_garment(self):
+        return round(self.total_fabric_needed / self.total_garments, 3)
+
+    @property
+    def longest_marker(self):
+        return max(self.marker_lengths)
+
+    @property
+    def smallest_marker(self):
+        return min(self.marker_lengths)
+
+    @property
+    def max_bundles(self):
+        # Number of end bit groups, one per multiple of the garment yield
+        return int(self.longest_marker / self.estimated_yield_per_garment)
+
+
+def rolls_from_columns(roll_numbers, roll_lengths) -> List[Roll]:
+    """Build the roll list from the roll number and roll length columns."""
+    return [(roll_num, round(float(roll_length), 3))
+            for roll_num, roll_length in zip(roll_numbers, roll_lengths)]
+
+
+def total_fabric_uploaded(rolls: Sequence[Roll]):
+    return round(sum(length for _, length in rolls), 3)
+
+
+def is_fabric_insufficient(cutplan: Cutplan, rolls: Sequence[Roll],
+                           allowance: float = FABRIC_ALLOWANCE):
+    """True when the fabric needed plus allowance exceeds the fabric uploaded."""
+    return cutplan.total_fabric_needed * (1 + allowance) > total_fabric_uploaded(rolls)
+
+
+@dataclass
+class IterationResult:
+    """Leftover fabric and shortfall of a single random roll plan."""
+
+    excess_rolls: float
+    fabric_saved_in_roll_form: float
+    usable_end_bits: float
+    unusable_bits: float
+    total_ply_shortfall: int
+    shortfall_quantity: int
+    garments_produced: int
+    end_bits_group_counts: List[int]
+    end_bits_group_sums: List[float]
+
+
+def _cut_plies(inventory, roll_id, marker_length, plies_needed, marker_residuals, stamp):
+    # Lay as many full plies as the roll allows, returning the plies laid.
+    # The roll is stamped with the 1-based position of the marker.
+    roll_length = inventory.lengths[roll_id]
+    plies_from_roll = min(roll_length // marker_length, plies_needed)
+    if plies_from_roll > 0:
+        inventory.used[roll_id] = stamp
+        residual_length = roll_length - plies_from_roll * marker_length
+        if residual_length > 0:
+            marker_residuals.append(inventory.add_residual(roll_id, residual_length))
+    return plies_from_roll
+
+
+def classify_fixed_lengths(cutplan: Cutplan, lengths: Iterable[int]):
+    """Split leftover fabric into roll form, usable end bits and unusable bits.
+
+    ``lengths`` are in fixed point (see :mod:`roll_plan.inventory`). Returns the
+    three category sums followed by the count and sum of usable end bits in
+    each garment-yield group, all in fixed point.
+    """
+    longest_marker = to_fixed(cutplan.longest_marker)
+    estimated_yield_per_garment = to_fixed(cutplan.estimated_yield_per_garment)
+    max_bundles = cutplan.max_bundles
+
+    fabric_saved_in_roll_form = usable_end_bits = unusable_bits = 0
+    end_bits_group_counts = [0] * max_bundles
+    end_bits_group_sums = [0] * max_bundles
+    for length in lengths:
+        if length >= longest_marker:
+            fabric_saved_in_roll_form += length
+        elif length >= estimated_yield_per_garment:
+            usable_end_bits += length
+            # Group usable end bits by multiples of yield per garment, the last
+            # group being open ended
+            group = min(length // estimated_yield_per_garment, max_bundles) - 1
+            end_bits_group_counts[group] += 1
+            end_bits_group_sums[group] += length
+        else:
+            unusable_bits += length
+
+    return (fabric_saved_in_roll_form, usable_end_bits, unusable_bits,
+            end_bits_group_counts, end_bits_group_sums)
+
+
+def classify_end_bits(cutplan: Cutplan, unused_rolls: Sequence[Roll]):
+    """:func:`classify_fixed_lengths` for ``(roll name, roll length)`` pairs."""
+    (fabric_saved_in_roll_form, usable_end_bits, unusable_bits,
+     end_bits_group_counts, end_bits_group_sums) = classify_fixed_lengths(
+        cutplan, (to_fixed(length) for _, length in unused_rolls))
+    return (from_fixed(fabric_saved_in_roll_form), from_fixed(usable_end_bits),
+            from_fixed(unusable_bits), end_bits_group_counts,
+            [from_fixed(group_sum) for group_sum in end_bits_group_sums])
+
+
+def simulate_iteration(cutplan: Cutplan, rolls: Union[RollInventory, Sequence[Roll]],
+                       rng: Optional[random.Random] = None,
+                       shuffle: Optional[Callable[[list, int], None]] = None,
+                       profiler: Optional[Profiler] = None,
+                       checkpoints: Optional[list] = None) -> IterationResult:
+    """Run one random roll plan over the cutplan.
+
+    For every marker the longest usable residual is laid first, then the
+    shuffled regular rolls, then the remaining residuals from longest down.
+    ``shuffle`` is called with the list of regular roll ids and the marker's
+    position in the cutplan and reorders the ids in place; it defaults to
+    ``rng.shuffle``. A ``profiler`` records the time spent in each pass.
+
+    ``checkpoints`` is a list to append ``(pieces, total_ply_shortfall,
+    shortfall_quantity, garments_produced)`` to at the start of every marker
+    and after the last, which with the inventory's cut stamps is enough to
+    resume the plan from any marker (see :func:`resume_iteration`).
+    """
+    if shuffle is None:
+        rng_shuffle = (rng or random).shuffle
+        shuffle = lambda roll_ids, marker_index: rng_shuffle(roll_ids)
+    if isinstance(rolls, RollInventory):
+        inventory = rolls.fresh()
+    else:
+        inventory = RollInventory.from_rolls(rolls)
+    return _simulate_from(cutplan, inventory, 0, (0, 0, 0), shuffle, profiler, checkpoints)
+
+
+def resume_iteration(cutplan: Cutplan, inventory: RollInventory, first_marker: int,
+                     totals: Tuple[int, int, int], shuffle: Callable[[list, int], None],
+                     checkpoints: Optional[list] = None) -> IterationResult:
+    """Carry on a roll plan from the start of the marker at ``first_marker``.
+
+    ``inventory`` holds the pieces as they were at that point (see
+    :meth:`RollInventory.rewind`) and ``totals`` the running total ply
+    shortfall, shortfall quantity and garments produced. The rolls still
+    regular and the residuals in the pool follow from the inventory, so with
+    the same ``shuffle`` the result is the same as a run from the first marker.
+    """
+    return _simulate_from(cutplan, inventory, first_marker, totals, shuffle, None, checkpoints)
+
+
+def _simulate_from(cutplan, inventory, first_marker, totals, shuffle, profiler, checkpoints):
+    lengths = inventory.lengths
+    used = inventory.used
+    marker_lengths = [to_fixed(length) for length in cutplan.marker_lengths]
+    smallest_marker = min(marker_lengths)
+
+    total_ply_shortfall, shortfall_quantity, garments_produced = totals
+
+    # Rolls not cut yet are regular, and uncut residuals long enough for a
+    # ply are in the residual pool
+    num_rolls = inventory.num_rolls
+    regular_rolls = [roll_id for roll_id in range(num_rolls) if not used[roll_id]]
+    regular_lengths = LengthIndex(lengths[roll_id] for roll_id in regular_rolls)
+    residual_rolls = RollIndex()
+    for roll_id in range(num_rolls, len(inventory)):
+        if not used[roll_id] and lengths[roll_id] >= smallest_marker:
+            residual_rolls.add(roll_id, lengths[roll_id])
+    profiling = profiler is not None
+    clock = time.perf_counter
+
+    for marker_index, (marker_length, ply_height, bundles) in enumerate(zip(
+            marker_lengths[first_marker:], cutplan.ply_heights[first_marker:],
+            cutplan.bundles[first_marker:]), first_marker):
+        if checkpoints is not None:
+            checkpoints.append((len(inventory), total_ply_shortfall, shortfall_quantity,
+                                garments_produced))
+        stamp = marker_index + 1
+        plies_planned = 0
+        marker_residuals = []
+        if profiling:
+            marker_started = clock()
+            residual_examined = residual_used = 0
+
+        # Check if any roll is long enough for at least one ply
+        can_make_at_least_one_ply = (regular_lengths.longest() >= marker_length
+                                     or residual_rolls.longest_length() >= marker_length)
+
+        # If no roll is long enough, record the whole marker as shortfall
+        if not can_make_at_least_one_ply:
+            total_ply_shortfall += ply_height
+            shortfall_quantity += ply_height * bundles
+            if profiling:
+                profiler.skip_marker(marker_index)
+            continue
+
+        # Use only the single longest usable residual roll first (if available)
+        if residual_rolls.longest_length() >= marker_length:
+            roll_id = residual_rolls.pop_longest()
+            plies_from_roll = _cut_plies(inventory, roll_id, marker_length,
+                                         ply_height - plies_planned, marker_residuals, stamp)
+            if plies_from_roll > 0:
+                plies_planned += plies_from_roll
+            else:
+                # Only happens for markers with no plies; the residual is dropped
+                used[roll_id] = stamp
+            if profiling:
+                residual_examined, residual_used = 1, int(plies_from_roll > 0)
+        if profiling:
+            residual_done = clock()
+            regular_examined = regular_used = 0
+
+        # If we still need more fabric, prioritize regular rolls over remaining residuals
+        if plies_planned < ply_height:
+            shuffle(regular_rolls, marker_index)
+
+            # Walk the shuffled rolls, setting aside those too short for this marker
+            too_short_rolls = []
+            position = 0
+            while plies_planned < ply_height and position < len(regular_rolls):
+                roll_id = regular_rolls[position]
+                position += 1
+                plies_from_roll = _cut_plies(inventory, roll_id, marker_length,
+                                             ply_height - plies_planned, marker_residuals,
+                                             stamp)
+                if plies_from_roll > 0:
+                    plies_planned += plies_from_roll
+                    regular_lengths.remove(lengths[roll_id])
+                else:
+                    too_short_rolls.append(roll_id)
+
+            # Unvisited rolls keep their order, followed by the too-short ones
+            regular_rolls = regular_rolls[position:] + too_short_rolls
+            if profiling:
+                regular_examined, regular_used = position, position - len(too_short_rolls)
+        if profiling:
+            regular_done = clock()
+            residuals_before = len(residual_rolls)
+
+        # After using all regular rolls, if we still need more, use remaining
+        # residuals longest first; once one is too short so are the rest
+        while plies_planned < ply_height and residual_rolls.longest_length() >= marker_length:
+            roll_id = residual_rolls.pop_longest()
+            plies_planned += _cut_plies(inventory, roll_id, marker_length,
+                                        ply_height - plies_planned, marker_residuals, stamp)
+
+        if profiling:
+            # Every residual taken in the leftover pass is long enough to cut
+            leftover_used = residuals_before - len(residual_rolls)
+            profiler.add_marker(marker_index, marker_started, residual_done, regular_done,
+                                clock(), residual_examined + regular_examined + leftover_used,
+                                residual_used + regular_used + leftover_used)
+
+        garments_produced += plies_planned * bundles
+
+        if plies_planned < ply_height:
+            ply_shortfall = ply_height - plies_planned
+            total_ply_shortfall += ply_shortfall
+            shortfall_quantity += ply_shortfall * bundles
+
+        # Residuals go back into the pool only if they can still make a ply;
+        # shorter ones stay in the inventory as unused end bits
+        for residual_id in marker_residuals:
+            if lengths[residual_id] >= smallest_marker:
+                residual_rolls.add(residual_id, lengths[residual_id])
+
+    if checkpoints is not None:
+        checkpoints.append((len(inventory), total_ply_shortfall, shortfall_quantity,
+                            garments_produced))
+
+    # Leftover fabric is every piece that was never cut
+    if profiling:
+        classify_started = clock()
+    (fabric_saved_in_roll_form, usable_end_bits, unusable_bits,
+     end_bits_group_counts, end_bits_group_sums) = classify_fixed_lengths(
+        cutplan, inventory.unused_lengths())
+    if profiling:
+        profiler.add("classify_end_bits", clock() - classify_started)
+
+    return IterationResult(
+        excess_rolls=from_fixed(inventory.excess_length()),
+        fabric_saved_in_roll_form=from_fixed(fabric_saved_in_roll_form),
+        usable_end_bits=from_fixed(usable_end_bits),
+        unusable_bits=from_fixed(unusable_bits),
+        total_ply_shortfall=total_ply_shortfall,
+        shortfall_quantity=shortfall_quantity,
+        garments_produced=garments_produced,
+        end_bits_group_counts=end_bits_group_counts,
+        end_bits_group_sums=[from_fixed(group_sum) for group_sum in end_bits_group_sums],
+    )
+
+
+@dataclass
+class SimulationSummary:
+    """Averages across iterations, as shown in the app's summary section."""
+
+    num_iterations: int
+    total_fabric_uploaded: float
+    total_fabric_needed: float
+    total_garments: int
+    estimated_yield_per_garment: float
+    avg_excess_rolls: float
+    avg_fabric_saved_in_roll_form: float
+    avg_usable_end_bits: float
+    avg_unusable_fabric: float
+    avg_ply_shortfall: float
+    avg_shortfall_quantity: float
+    avg_garments_produced: float
+    avg_end_bits_group_counts: List[float]
+    avg_end_bits_group_sums: List[float]
+    wastage_percentage: float
+    usable_end_bits_percentage: float
+    ply_shortfall_percentage: float
+    shortfall_percentage: float
+    garments_produced_percentage: float
+    # Half-widths of the confidence intervals on the two headline figures
+    wastage_percentage_margin: Optional[float] = None
+    shortfall_quantity_margin: Optional[float] = None
+
+    def end_bits_table(self):
+        """Rows of the usable end bits grouping table."""
+        table_data = []
+        for i, (avg_count, avg_sum) in enumerate(
+                zip(self.avg_end_bits_group_counts, self.avg_end_bits_group_sums)):
+            table_data.append({
+                "Group": f"End Bits for {i + 1}-{i + 2} bundles",
+                "Avg. Number of End Bits": int(avg_count),  # Floor the value
+                "Avg. Fabric Available in Group": avg_sum,
+            })
+        return table_data
+
+
+def summarize(cutplan: Cutplan, rolls: Sequence[Roll],
+              stats: Union[SummaryAccumulator, Sequence[IterationResult]],
+              confidence: float = DEFAULT_CONFIDENCE) -> SimulationSummary:
+    """Average the iteration statistics and express them against the cutplan.
+
+    ``stats`` is an accumulator or a sequence of iteration results.
+    """
+    if not isinstance(stats, SummaryAccumulator):
+        stats = SummaryAccumulator.from_iterations(cutplan.max_bundles, stats)
+    total_fabric_needed = cutplan.total_fabric_needed
+    total_garments = cutplan.total_garments
+
+    avg_excess_rolls = round(stats["excess_rolls"].mean, 3)
+    avg_fabric_saved_in_roll_form = round(stats["fabric_saved_in_roll_form"].mean, 3)
+    avg_usable_end_bits = round(stats["usable_end_bits"].mean, 3)
+    avg_unusable_fabric = round(stats["unusable_bits"].mean, 3)
+    avg_ply_shortfall = round(stats["total_ply_shortfall"].mean, 1)
+    avg_shortfall_quantity = round(stats["shortfall_quantity"].mean, 1)
+    avg_garments_produced = round(stats["garments_produced"].mean, 1)
+
+    avg_end_bits_group_counts = [round(stat.mean, 3) for stat in stats.end_bits_group_counts]
+    avg_end_bits_group_sums = [round(stat.mean, 3) for stat in stats.end_bits_group_sums]
+
+    total_wastage = avg_usable_end_bits + avg_unusable_fabric
+
+    wastage_percentage_margin = shortfall_quantity_margin = None
+    if len(stats) > 1:
+        wastage_percentage_margin = round(
+            stats["wastage"].margin(confidence) / total_fabric_needed * 100, 3)
+        shortfall_quantity_margin = round(stats["shortfall_quantity"].margin(confidence), 1)
+
+    return SimulationSummary(
+        num_iterations=len(stats),
+        total_fabric_uploaded=total_fabric_uploaded(rolls),
+        total_fabric_needed=total_fabric_needed,
+        total_garments=total_garments,
+        estimated_yield_per_garment=cutplan.estimated_yield_per_garment,
+        avg_excess_rolls=avg_excess_rolls,
+        avg_fabric_saved_in_roll_form=avg_fabric_saved_in_roll_form,
+        avg_usable_end_bits=avg_usable_end_bits,
+        avg_unusable_fabric=avg_unusable_fabric,
+        avg_ply_shortfall=avg_ply_shortfall,
+        avg_shortfall_quantity=avg_shortfall_quantity,
+        avg_garments_produced=avg_garments_produced,
+        avg_end_bits_group_counts=avg_end_bits_group_counts,
+        avg_end_bits_group_sums=avg_end_bits_group_sums,
+        wastage_percentage=round((total_wastage / total_fabric_needed) * 100, 3),
+        usable_end_bits_percentage=round((avg_usable_end_bits / total_fabric_needed) * 100, 3),
+        ply_shortfall_percentage=round((avg_ply_shortfall / cutplan.total_plies) * 100, 1),
+        shortfall_percentage=round((avg_shortfall_quantity / total_garments) * 100, 1),
+        garments_produced_percentage=round((avg_garments_produced / total_garments) * 100, 1),
+        wastage_percentage_margin=wastage_percentage_margin,
+        shortfall_quantity_margin=shortfall_quantity_margin,
+    )
+
+
+@dataclass
+class SimulationResult:
+    summary: SimulationSummary
+    stats: SummaryAccumulator
+    # Individual iteration results, only kept when asked for
+    iterations: Optional[List[IterationResult]] = None
+    # Why an adaptive run stopped: "converged", "time_budget" or "max_iterations"
+    stop_reason: Optional[str] = None
+
+
+def run_simulation(cutplan: Cutplan, rolls: Sequence[Roll],
+                   num_iterations: int = DEFAULT_ITERATIONS,
+                   seed: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   stopping: Optional[StoppingRule] = None,
+                   keep_iterations: bool = False,
+                   profiler: Optional[Profiler] = None) -> SimulationResult:
+    """Run ``num_iterations`` random roll plans and summarize them.
+
+    With a ``stopping`` rule the run ends as soon as the rule is met, and
+    ``num_iterations`` is only the upper limit. ``progress`` is called with
+    the 1-based iteration number and ``num_iterations`` before each
+    iteration. A ``profiler`` records where the time goes, counting the
+    progress callback as rendering.
+    """
+    rng = random.Random(seed)
+    inventory = RollInventory.from_rolls(rolls)
+    stats = SummaryAccumulator(cutplan.max_bundles)
+    iterations = [] if keep_iterations else None
+    stop_reason = None
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.marker_names = cutplan.marker_names
+
+    for iteration in range(num_iterations):
+        if progress is not None:
+            with phase(profiler, "render"):
+                progress(iteration + 1, num_iterations)
+        result = simulate_iteration(cutplan, inventory, rng, profiler=profiler)
+        with phase(profiler, "accumulate_stats"):
+            stats.add(result)
+        if keep_iterations:
+            iterations.append(result)
+        if stopping is not None:
+            stop_reason = stopping.stop_reason(stats, cutplan.total_fabric_needed,
+                                               time.perf_counter() - started)
+            if stop_reason:
+                break
+    else:
+        if stopping is not None:
+            stop_reason = "max_iterations"
+
+    confidence = stopping.confidence if stopping is not None else DEFAULT_CONFIDENCE
+    summary = summarize(cutplan, rolls, stats, confidence)
+    return SimulationResult(summary, stats, iterations, stop_reason)
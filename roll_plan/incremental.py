@@ -0,0 +1,250 @@
+"""Re-running roll plans after an edit, from the first marker it affects.
+
+Planners iterate: change the ply height of one marker or drop a damaged roll,
+and run again. :class:`IncrementalSimulation` keeps a checkpoint of every
+iteration at every marker and replays each iteration only from the first
+marker the edit can change. The results are the same as calling
+:meth:`IncrementalSimulation.run` again after the edit, and for cutplan edits
+the same as a new simulation of the edited cutplan with the same seed.
+
+Two things make this possible:
+
+* Every (iteration, marker) has its own random stream, and regular rolls are
+  ordered by a random key per roll id, their position in the original list.
+  An iteration's shuffles therefore do not depend on what happened at earlier
+  markers, or on which other rolls are still there.
+* The checkpoints are compact. The inventory only ever gains residuals and
+  marks pieces as cut with the marker they were cut for, so the piece count
+  and running totals at each marker are enough to rewind the final inventory
+  to the start of any marker.
+
+Checkpoints take memory in proportion to the pieces an iteration ends with.
+An iteration's checkpoints are only kept if they fit in ``memory_limit``
+with those already kept; the others are run from the first marker when next
+needed. Keeping the ones already held, rather than the latest, means each
+update replays the same iterations from their checkpoints instead of each
+iteration evicting the next one due.
+"""
+import random
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from .engine import (
+    DEFAULT_ITERATIONS,
+    Cutplan,
+    IterationResult,
+    Roll,
+    SimulationResult,
+    resume_iteration,
+    summarize,
+)
+from .inventory import RollInventory
+from .stats import SummaryAccumulator
+
+DEFAULT_MEMORY_LIMIT = 256 * 2**20
+
+# Rough size of one checkpoint tuple of four ints
+_CHECKPOINT_BYTES = 120
+
+
+def keyed_shuffle(seed: int, iteration: int, num_rolls: int):
+    """Shuffle hook ordering roll ids by keys from a stream per marker.
+
+    The key of each roll id comes from a stream seeded by ``seed``,
+    ``iteration`` and the marker position, so the order of any two rolls at a
+    marker is the same whichever other rolls are left.
+    """
+    base = ((seed % 2**64) << 64) | (iteration << 32)
+
+    def shuffle(roll_ids, marker_index):
+        next_key = random.Random(base | marker_index).random
+        keys = [next_key() for _ in range(num_rolls)]
+        roll_ids.sort(key=keys.__getitem__)
+
+    return shuffle
+
+
+def first_changed_marker(old: Cutplan, new: Cutplan):
+    """Position of the first marker at which ``new`` can play out differently.
+
+    Residuals are kept for later markers by comparing them with the smallest
+    marker, so changing it affects every marker.
+    """
+    if old.smallest_marker != new.smallest_marker:
+        return 0
+    for marker_index, (old_marker, new_marker) in enumerate(zip(
+            zip(old.marker_lengths, old.ply_heights, old.bundles),
+            zip(new.marker_lengths, new.ply_heights, new.bundles))):
+        if old_marker != new_marker:
+            return marker_index
+    return min(len(old), len(new))
+
+
+def dropped_rolls(old_rolls: Sequence[Roll], new_rolls: Sequence[Roll]):
+    """The ``(roll name, roll length)`` pairs removed from ``old_rolls`` to
+    give ``new_rolls``.
+
+    Returns None when ``new_rolls`` has rolls, or roll lengths, that are not
+    in ``old_rolls``.
+    """
+    remaining = {}
+    for roll in old_rolls:
+        remaining[roll] = remaining.get(roll, 0) + 1
+    for roll in new_rolls:
+        if not remaining.get(roll):
+            return None
+        remaining[roll] -= 1
+    return [roll for roll, count in remaining.items() for _ in range(count)]
+
+
+class _Trace:
+    """An iteration's final inventory and its checkpoint at every marker."""
+
+    __slots__ = ("inventory", "checkpoints")
+
+    def __init__(self, inventory, checkpoints):
+        self.inventory = inventory
+        self.checkpoints = checkpoints
+
+    @property
+    def nbytes(self):
+        inventory = self.inventory
+        return (len(inventory) * (inventory.lengths.itemsize + inventory.parents.itemsize
+                                  + inventory.used.itemsize + 1)
+                + len(self.checkpoints) * _CHECKPOINT_BYTES)
+
+
+class IncrementalSimulation:
+    """Random roll plans that can be re-run cheaply after editing the inputs.
+
+    Call :meth:`run` once, then :meth:`update` with the edited cutplan and/or
+    the rolls to drop. Dropped rolls keep their place in the inventory with no
+    length, so the remaining rolls keep their random keys. That makes the
+    result after dropping rolls the same as :meth:`run` on this object, but
+    not the same as a new simulation of the remaining rolls, whose positions
+    and so keys have shifted.
+    """
+
+    def __init__(self, cutplan: Cutplan, rolls: Sequence[Roll],
+                 num_iterations: int = DEFAULT_ITERATIONS, seed: Optional[int] = None,
+                 memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        self.cutplan = cutplan
+        self.rolls = list(rolls)
+        self.num_iterations = num_iterations
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.memory_limit = memory_limit
+        self.inventory = RollInventory.from_rolls(rolls)
+        self.dropped = set()
+        # Markers simulated by the last run or update, for judging the saving
+        self.markers_simulated = 0
+        # Iterations finished by the current run or update
+        self.completed = 0
+        self._results: List[Optional[IterationResult]] = [None] * num_iterations
+        self._traces = {}
+        self._trace_bytes = 0
+
+    @property
+    def remaining_rolls(self):
+        return [roll for roll_id, roll in enumerate(self.rolls) if roll_id not in self.dropped]
+
+    def run(self, progress: Optional[Callable[[int, int], None]] = None) -> SimulationResult:
+        """Run every iteration from the first marker.
+
+        ``progress`` is called like :func:`roll_plan.engine.run_simulation`'s.
+        """
+        self.markers_simulated = self.completed = 0
+        for iteration in range(self.num_iterations):
+            self.completed = iteration
+            if progress is not None:
+                progress(iteration + 1, self.num_iterations)
+            self._replay(iteration, 0)
+        self.completed = self.num_iterations
+        return self._result()
+
+    def update(self, cutplan: Optional[Cutplan] = None, drop_rolls: Iterable = (),
+               progress: Optional[Callable[[int, int], None]] = None) -> SimulationResult:
+        """Apply an edit and re-run each iteration from the first marker it affects.
+
+        ``drop_rolls`` are roll numbers to remove from the inventory, or
+        ``(roll number, roll length)`` pairs to tell apart rolls that share a
+        number, as :func:`dropped_rolls` returns.
+        """
+        first_marker = len(self.cutplan)
+        if cutplan is not None:
+            first_marker = first_changed_marker(self.cutplan, cutplan)
+            self.cutplan = cutplan
+        new_drops = self._drop(drop_rolls)
+
+        self.markers_simulated = self.completed = 0
+        for iteration in range(self.num_iterations):
+            self.completed = iteration
+            if progress is not None:
+                progress(iteration + 1, self.num_iterations)
+            trace = self._traces.get(iteration)
+            if trace is None:
+                self._replay(iteration, 0)
+                continue
+            # A dropped roll only changes the plan from the marker it was cut
+            # for; a roll that was never cut just leaves the leftovers
+            start = first_marker
+            for roll_id in new_drops:
+                stamp = trace.inventory.used[roll_id]
+                start = min(start, stamp - 1 if stamp else len(self.cutplan))
+            self._replay(iteration, start)
+        self.completed = self.num_iterations
+        return self._result()
+
+    def _drop(self, rolls):
+        new_drops = []
+        for roll in rolls:
+            if isinstance(roll, tuple) and len(roll) == 2:
+                matches = lambda candidate: candidate == roll
+            else:
+                matches = lambda candidate: candidate[0] == roll
+            for roll_id, candidate in enumerate(self.rolls):
+                if matches(candidate) and roll_id not in self.dropped:
+                    break
+            else:
+                raise ValueError(f"No roll {roll!r} left to drop")
+            self.dropped.add(roll_id)
+            self.inventory.lengths[roll_id] = 0
+            new_drops.append(roll_id)
+        return new_drops
+
+    def _replay(self, iteration, first_marker):
+        trace = self._traces.pop(iteration, None)
+        if trace is not None:
+            self._trace_bytes -= trace.nbytes
+        if trace is None or first_marker == 0:
+            inventory = self.inventory.fresh()
+            checkpoints = []
+            totals = (0, 0, 0)
+            first_marker = 0
+        else:
+            # Resume from the checkpoint, with this edit's drops applied
+            pieces, *totals = trace.checkpoints[first_marker]
+            inventory = trace.inventory.rewind(pieces, first_marker)
+            for roll_id in self.dropped:
+                inventory.lengths[roll_id] = 0
+            checkpoints = trace.checkpoints[:first_marker]
+
+        shuffle = keyed_shuffle(self.seed, iteration, self.inventory.num_rolls)
+        self._results[iteration] = resume_iteration(
+            self.cutplan, inventory, first_marker, tuple(totals), shuffle, checkpoints)
+        self.markers_simulated += len(self.cutplan) - first_marker
+
+        trace = _Trace(inventory, checkpoints)
+        if self._trace_bytes + trace.nbytes <= self.memory_limit:
+            self._traces[iteration] = trace
+            self._trace_bytes += trace.nbytes
+
+    def partial_result(self) -> Optional[SimulationResult]:
+        """Summary of the iterations the current run or update has finished, if any."""
+        if not self.completed:
+            return None
+        return self._result(self.completed)
+
+    def _result(self, num_iterations=None):
+        results = self._results[:num_iterations]
+        stats = SummaryAccumulator.from_iterations(self.cutplan.max_bundles, results)
+        summary = summarize(self.cutplan, self.remaining_rolls, stats)
+        return SimulationResult(summary, stats, results)
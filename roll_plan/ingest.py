@@ -0,0 +1,248 @@
+"""Loading cutplans and roll inventories.
+
+Inputs come from an Excel workbook with ``cutplan`` and ``rolls_data`` sheets,
+or from a directory holding the same two tables as CSV or Parquet files
+(``cutplan.csv``, ``rolls_data.parquet``, ...), which skips openpyxl entirely.
+
+Parsed and validated inputs are cached on the hash of the file contents, in
+memory with a bounded number of entries and optionally on disk as Parquet,
+so re-reading an unchanged file costs a hash instead of a parse.
+"""
+import contextlib
+import hashlib
+import io
+import os
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from .engine import Cutplan, rolls_from_columns
+
+CUTPLAN_SHEET = "cutplan"
+ROLLS_SHEET = "rolls_data"
+
+REQUIRED_COLUMNS = {
+    CUTPLAN_SHEET: ("Marker_Name", "Marker_Length", "Ply_Height", "Bundles"),
+    ROLLS_SHEET: ("Roll_Number", "Roll_Length"),
+}
+
+# Table file formats, in order of preference when a directory has both
+TABLE_SUFFIXES = (".parquet", ".csv")
+
+# Directory for the on-disk cache when none is passed explicitly
+CACHE_DIR_ENV = "ROLL_PLAN_CACHE_DIR"
+
+DEFAULT_CACHE_SIZE = 8
+
+# Bump when parsing changes so stale on-disk cache entries are not reused
+_CACHE_VERSION = b"1"
+
+_cache = OrderedDict()
+_cache_size = DEFAULT_CACHE_SIZE
+
+
+class CutplanError(ValueError):
+    """The input is missing data needed to plan rolls."""
+
+
+def validate_frames(cutplan_df, rolls_df):
+    """Check both tables have the columns the engine needs, and the cutplan can be planned."""
+    if "Bundles" not in cutplan_df.columns:
+        raise CutplanError(
+            "Cutplan must contain a 'Bundles' column to calculate yield per garment.")
+    for sheet, df in ((CUTPLAN_SHEET, cutplan_df), (ROLLS_SHEET, rolls_df)):
+        missing = [column for column in REQUIRED_COLUMNS[sheet] if column not in df.columns]
+        if missing:
+            raise CutplanError(f"The {sheet} table is missing column(s): {', '.join(missing)}.")
+
+    # Blank or text cells would only fail once converted, with no hint of
+    # which column was at fault
+    for sheet, df, column in ((CUTPLAN_SHEET, cutplan_df, "Ply_Height"),
+                              (CUTPLAN_SHEET, cutplan_df, "Bundles"),
+                              (ROLLS_SHEET, rolls_df, "Roll_Length")):
+        values = _numeric(df, column)
+        if values.isna().any() or (values < 0).any():
+            raise CutplanError(f"Every {column} in the {sheet} table must be a number "
+                               f"of zero or more.")
+
+    # The engine divides by the garment count and needs a longest and shortest
+    # marker, so these would fail part way through a run
+    if cutplan_df.empty:
+        raise CutplanError("The cutplan table has no markers.")
+    marker_lengths = _numeric(cutplan_df, "Marker_Length")
+    if marker_lengths.isna().any() or (marker_lengths <= 0).any():
+        raise CutplanError("Every Marker_Length must be a positive number.")
+    garments = (_numeric(cutplan_df, "Ply_Height") * _numeric(cutplan_df, "Bundles")).sum()
+    if not garments > 0:
+        raise CutplanError("The cutplan plans no garments: Ply_Height times Bundles sums to zero.")
+
+
+def _numeric(df, column):
+    # Numbers typed as text, such as "5.0", count as numbers
+    return pd.to_numeric(df[column], errors="coerce")
+
+
+def frames_to_inputs(cutplan_df, rolls_df):
+    """Validate the cutplan and rolls_data tables and convert them into engine inputs."""
+    validate_frames(cutplan_df, rolls_df)
+    cutplan = Cutplan.from_columns(
+        cutplan_df["Marker_Name"], _numeric(cutplan_df, "Marker_Length"),
+        _numeric(cutplan_df, "Ply_Height"), _numeric(cutplan_df, "Bundles"))
+    rolls = tuple(rolls_from_columns(rolls_df["Roll_Number"], _numeric(rolls_df, "Roll_Length")))
+    return cutplan, rolls
+
+
+def _wanted_columns(sheet):
+    # Column filter so only the columns the engine uses are parsed
+    return lambda column: column in REQUIRED_COLUMNS[sheet]
+
+
+def read_workbook(source):
+    """Read the cutplan and rolls_data sheets of an Excel workbook."""
+    with pd.ExcelFile(source) as xls:
+        cutplan_df = pd.read_excel(xls, CUTPLAN_SHEET, usecols=_wanted_columns(CUTPLAN_SHEET))
+        rolls_df = pd.read_excel(xls, ROLLS_SHEET, usecols=_wanted_columns(ROLLS_SHEET))
+    return cutplan_df, rolls_df
+
+
+def _read_table(path, sheet):
+    path = Path(path)
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+        return df[[column for column in df.columns if _wanted_columns(sheet)(column)]]
+    if path.suffix == ".csv":
+        return pd.read_csv(path, usecols=_wanted_columns(sheet))
+    raise CutplanError(f"Unsupported table format: {path.name}")
+
+
+def read_tables(cutplan_path, rolls_path):
+    """Read the cutplan and rolls_data tables from CSV or Parquet files."""
+    return _read_table(cutplan_path, CUTPLAN_SHEET), _read_table(rolls_path, ROLLS_SHEET)
+
+
+def find_tables(directory):
+    """Paths of the cutplan and rolls_data tables in a directory."""
+    paths = []
+    for sheet in (CUTPLAN_SHEET, ROLLS_SHEET):
+        for suffix in TABLE_SUFFIXES:
+            path = Path(directory) / f"{sheet}{suffix}"
+            if path.exists():
+                paths.append(path)
+                break
+        else:
+            raise CutplanError(f"No {sheet}.parquet or {sheet}.csv in {directory}")
+    return tuple(paths)
+
+
+def _read_bytes(source):
+    # Contents of a path or of a file-like object such as a Streamlit upload
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "read"):
+        data = source.read()
+        source.seek(0)
+        return data
+    return Path(source).read_bytes()
+
+
+def content_hash(*blobs):
+    digest = hashlib.sha256(_CACHE_VERSION)
+    for blob in blobs:
+        digest.update(len(blob).to_bytes(8, "little"))
+        digest.update(blob)
+    return digest.hexdigest()
+
+
+def configure_cache(max_entries):
+    """Set how many parsed inputs the in-memory cache holds."""
+    global _cache_size
+    _cache_size = max_entries
+    while len(_cache) > _cache_size:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def _disk_cache_paths(cache_dir, key):
+    return (Path(cache_dir) / f"{key}.{CUTPLAN_SHEET}.parquet",
+            Path(cache_dir) / f"{key}.{ROLLS_SHEET}.parquet")
+
+
+def _read_disk_cache(cache_dir, key):
+    cutplan_path, rolls_path = _disk_cache_paths(cache_dir, key)
+    if not (cutplan_path.exists() and rolls_path.exists()):
+        return None
+    try:
+        return pd.read_parquet(cutplan_path), pd.read_parquet(rolls_path)
+    except (ImportError, OSError, ValueError):
+        return None
+
+
+def _write_disk_cache(cache_dir, key, frames):
+    paths = _disk_cache_paths(cache_dir, key)
+    partial_paths = [path.with_suffix(".partial") for path in paths]
+    try:
+        paths[0].parent.mkdir(parents=True, exist_ok=True)
+        # Write both tables before renaming either, so a concurrent reader
+        # never sees half a file and a table that fails to convert does not
+        # leave the other one behind
+        for df, partial_path in zip(frames, partial_paths):
+            df.to_parquet(partial_path, index=False)
+        for partial_path, path in zip(partial_paths, paths):
+            os.replace(partial_path, path)
+    except (ImportError, OSError, TypeError, ValueError) as exc:
+        # Parquet support is optional and mixed-type columns, such as roll
+        # numbers that are partly numbers and partly text, may not convert;
+        # the cache is only an optimisation
+        for path in (*partial_paths, *paths):
+            with contextlib.suppress(OSError):
+                path.unlink(missing_ok=True)
+        warnings.warn(f"Not caching parsed input on disk: {exc}")
+
+
+def _load_cached(key, read_frames, cache_dir):
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+    frames = _read_disk_cache(cache_dir, key) if cache_dir else None
+    from_disk = frames is not None
+    if not from_disk:
+        frames = read_frames()
+    inputs = frames_to_inputs(*frames)
+    if cache_dir and not from_disk:
+        _write_disk_cache(cache_dir, key, frames)
+
+    _cache[key] = inputs
+    while len(_cache) > _cache_size:
+        _cache.popitem(last=False)
+    return inputs
+
+
+def load_workbook(source, cache_dir=None):
+    """Read a workbook and return ``(cutplan, rolls)`` for the engine.
+
+    ``source`` is a path or a file-like object. ``cache_dir`` (or the
+    ``ROLL_PLAN_CACHE_DIR`` environment variable) enables the on-disk cache.
+    """
+    data = _read_bytes(source)
+    return _load_cached(content_hash(data), lambda: read_workbook(io.BytesIO(data)), cache_dir)
+
+
+def load_tables(cutplan_path, rolls_path, cache_dir=None):
+    """Like :func:`load_workbook`, for cutplan and rolls_data CSV or Parquet files."""
+    key = content_hash(Path(cutplan_path).read_bytes(), Path(rolls_path).read_bytes())
+    return _load_cached(key, lambda: read_tables(cutplan_path, rolls_path), cache_dir)
+
+
+def load_inputs(source, cache_dir=None):
+    """Load a workbook, or a directory of cutplan and rolls_data tables."""
+    if not hasattr(source, "read") and Path(source).is_dir():
+        return load_tables(*find_tables(source), cache_dir=cache_dir)
+    return load_workbook(source, cache_dir)
@@ -0,0 +1,156 @@
+"""Roll inventory storage for the simulation engine.
+
+Lengths are held as integers in thousandths of the length unit (millimetres
+for lengths in metres), the precision the app has always rounded lengths to,
+so cutting plies is exact integer arithmetic.
+"""
+from array import array
+from bisect import bisect_left, insort
+
+LENGTH_SCALE = 1000
+
+
+def to_fixed(length):
+    """Convert a length to integer thousandths of a unit."""
+    return int(round(length * LENGTH_SCALE))
+
+
+def from_fixed(length):
+    return length / LENGTH_SCALE
+
+
+class RollInventory:
+    """Rolls and the residuals cut from them, stored in parallel typed arrays.
+
+    A roll id indexes the arrays. The original rolls have ids ``0..n-1`` and
+    each residual is appended with the id of the piece it was cut from as its
+    parent. ``used`` marks pieces that have been cut with the 1-based position
+    of the marker they were cut for, and is 0 for the others, so the leftover
+    fabric of a roll plan is every piece not marked used.
+    """
+
+    __slots__ = ("roll_names", "lengths", "parents", "is_residual", "used")
+
+    def __init__(self, roll_names, lengths):
+        self.roll_names = list(roll_names)  # Names of the original rolls only
+        self.lengths = array("q", lengths)
+        self.parents = array("i", range(len(self.lengths)))
+        self.is_residual = bytearray(len(self.lengths))
+        self.used = array("i", [0]) * len(self.lengths)
+
+    @classmethod
+    def from_rolls(cls, rolls):
+        """Build an inventory from ``(roll name, roll length)`` pairs."""
+        return cls([name for name, _ in rolls], [to_fixed(length) for _, length in rolls])
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def num_rolls(self):
+        return len(self.roll_names)
+
+    def fresh(self):
+        """A copy holding only the original rolls, none of them used."""
+        num_rolls = self.num_rolls
+        inventory = RollInventory.__new__(RollInventory)
+        inventory.roll_names = self.roll_names
+        inventory.lengths = self.lengths[:num_rolls]
+        inventory.parents = self.parents[:num_rolls]
+        inventory.is_residual = bytearray(num_rolls)
+        inventory.used = array("i", [0]) * num_rolls
+        return inventory
+
+    def rewind(self, num_pieces, marker_index):
+        """A copy as it was at the start of the marker at ``marker_index``.
+
+        ``num_pieces`` is the number of pieces there were then; cuts for that
+        marker and later ones are undone.
+        """
+        inventory = RollInventory.__new__(RollInventory)
+        inventory.roll_names = self.roll_names
+        inventory.lengths = self.lengths[:num_pieces]
+        inventory.parents = self.parents[:num_pieces]
+        inventory.is_residual = self.is_residual[:num_pieces]
+        inventory.used = array("i", (stamp if stamp <= marker_index else 0
+                                     for stamp in self.used[:num_pieces]))
+        return inventory
+
+    def add_residual(self, parent, length):
+        """Record the residual left after cutting ``parent`` and return its id."""
+        self.lengths.append(length)
+        self.parents.append(parent)
+        self.is_residual.append(1)
+        self.used.append(0)
+        return len(self.lengths) - 1
+
+    def name(self, roll_id):
+        """Name of a piece: its original roll's name with a "-bit" per cut."""
+        suffix = ""
+        while self.is_residual[roll_id]:
+            suffix += "-bit"
+            roll_id = self.parents[roll_id]
+        return f"{self.roll_names[roll_id]}{suffix}"
+
+    def unused_lengths(self):
+        """Lengths of all pieces that were never cut."""
+        return [length for length, used in zip(self.lengths, self.used) if not used]
+
+    def excess_length(self):
+        """Total length of the original rolls that were never cut."""
+        num_rolls = self.num_rolls
+        return sum(length for length, used
+                   in zip(self.lengths[:num_rolls], self.used[:num_rolls]) if not used)
+
+
+# RollIndex packs a roll's length and id into a single int key, so its sorted
+# list holds plain ints. Inverting the id makes earlier rolls sort last among
+# rolls of equal length, so they are taken first.
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+class RollIndex:
+    """Roll ids kept ordered by length.
+
+    Finding and taking the longest roll is O(1) and adding a roll is a binary
+    search plus a list insert. Among rolls of equal length the one with the
+    lowest id is taken first.
+    """
+
+    __slots__ = ("_keys",)
+
+    def __init__(self):
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return (_ID_MASK - (key & _ID_MASK) for key in self._keys)
+
+    def add(self, roll_id, length):
+        insort(self._keys, (length << _ID_BITS) | (_ID_MASK - roll_id))
+
+    def longest_length(self):
+        """Length of the longest roll, or -1 when empty."""
+        return self._keys[-1] >> _ID_BITS if self._keys else -1
+
+    def pop_longest(self):
+        return _ID_MASK - (self._keys.pop() & _ID_MASK)
+
+
+class LengthIndex:
+    """Multiset of lengths that reports the longest in O(1) as rolls are taken."""
+
+    __slots__ = ("_lengths",)
+
+    def __init__(self, lengths):
+        self._lengths = sorted(lengths)
+
+    def remove(self, length):
+        del self._lengths[bisect_left(self._lengths, length)]
+
+    def longest(self):
+        """The longest length, or -1 when empty."""
+        return self._lengths[-1] if self._lengths else -1
@@ -0,0 +1,209 @@
+"""Running a simulation or a roll plan search in a background thread.
+
+The app starts a :class:`SimulationJob` or :class:`SolverJob` and polls it on
+every rerun instead of blocking the script for the whole run. A simulation
+job publishes its progress and a summary of the iterations so far at most
+once per ``update_interval``, and stops at the next iteration when
+cancelled, with the iterations run so far as its result. A solver job stops
+at the next plan when cancelled, with the best plan found so far.
+"""
+import threading
+import time
+from typing import Iterable, Optional, Sequence
+
+from .engine import Cutplan, Roll, SimulationResult, SimulationSummary, run_simulation, summarize
+from .incremental import IncrementalSimulation
+from .profiling import Profiler
+from .solver import SolverResult, compare_with_random, solve
+from .stats import DEFAULT_CONFIDENCE, StoppingRule
+
+# Seconds between updates of the progress and partial summary
+DEFAULT_UPDATE_INTERVAL = 0.5
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _JobStopping:
+    """Stopping rule that also publishes the job's progress and honours cancelling.
+
+    The engine checks it after every iteration, with the statistics so far.
+    """
+
+    def __init__(self, job, stopping):
+        self.job = job
+        self.stopping = stopping
+        self.confidence = stopping.confidence if stopping is not None else DEFAULT_CONFIDENCE
+
+    def stop_reason(self, stats, total_fabric_needed, elapsed):
+        job = self.job
+        if job.cancelled:
+            return "cancelled"
+        job.iteration = len(stats)
+        job._publish(lambda: summarize(job.cutplan, job.rolls, stats, self.confidence))
+        if self.stopping is None:
+            return None
+        return self.stopping.stop_reason(stats, total_fabric_needed, elapsed)
+
+
+class _Job:
+    """Work done in a daemon thread, polled through ``state``.
+
+    ``state`` goes from "running" to "done", "cancelled" or "failed";
+    ``result`` and ``error`` are set when the job ends.
+    """
+
+    def __init__(self):
+        self.state = "running"
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.started = self.finished = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the job to stop at the next step."""
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+        return not self.running
+
+    def _work(self):
+        """Do the work, returning the result and the final state."""
+        raise NotImplementedError
+
+    def _run(self):
+        try:
+            result, state = self._work()
+        except Exception as exc:
+            self.error = exc
+            self.state = "failed"
+        else:
+            self.result = result
+            self.state = state
+        finally:
+            self.finished = time.perf_counter()
+
+
+class SimulationJob(_Job):
+    """Random roll plans simulated in a daemon thread.
+
+    Runs :func:`roll_plan.engine.run_simulation`, or when ``simulation`` is
+    given, its :meth:`~roll_plan.incremental.IncrementalSimulation.run` or,
+    with ``drop_rolls``, its ``update`` to ``cutplan``. A cancelled update
+    leaves ``simulation`` partly edited, so it should not be reused.
+
+    ``iteration`` and ``partial`` are updated as the job runs.
+    """
+
+    def __init__(self, cutplan: Cutplan, rolls: Sequence[Roll], num_iterations: int,
+                 stopping: Optional[StoppingRule] = None, profiler: Optional[Profiler] = None,
+                 simulation: Optional[IncrementalSimulation] = None,
+                 drop_rolls: Optional[Iterable] = None,
+                 update_interval: float = DEFAULT_UPDATE_INTERVAL):
+        super().__init__()
+        self.cutplan = cutplan
+        self.rolls = rolls
+        self.num_iterations = num_iterations
+        self.stopping = stopping
+        self.profiler = profiler
+        self.simulation = simulation
+        self.drop_rolls = drop_rolls
+        self.update_interval = update_interval
+        self.iteration = 0
+        self.partial: Optional[SimulationSummary] = None
+        self.result: Optional[SimulationResult] = None
+        self._last_update = 0.0
+
+    def _publish(self, partial_summary):
+        # Summarizing costs more than an iteration of a small order, so only
+        # do it once per update interval
+        now = time.perf_counter()
+        if now - self._last_update >= self.update_interval:
+            self._last_update = now
+            self.partial = partial_summary()
+
+    def _incremental_progress(self, iteration, num_iterations):
+        if self.cancelled:
+            raise _Cancelled
+        self.iteration = iteration - 1
+        if self.simulation.completed:
+            self._publish(lambda: self.simulation.partial_result().summary)
+
+    def _work(self):
+        if self.simulation is None:
+            result = run_simulation(self.cutplan, self.rolls, self.num_iterations,
+                                    stopping=_JobStopping(self, self.stopping),
+                                    profiler=self.profiler)
+            if self.stopping is None and result.stop_reason == "max_iterations":
+                result.stop_reason = None
+        else:
+            try:
+                if self.drop_rolls is None:
+                    result = self.simulation.run(progress=self._incremental_progress)
+                else:
+                    result = self.simulation.update(self.cutplan, self.drop_rolls,
+                                                    progress=self._incremental_progress)
+            except _Cancelled:
+                result = self.simulation.partial_result()
+                if result is not None:
+                    result.stop_reason = "cancelled"
+        self.iteration = result.summary.num_iterations if result is not None else 0
+        self.partial = result.summary if result is not None else None
+        state = "cancelled" if result is None or result.stop_reason == "cancelled" else "done"
+        return result, state
+
+
+class SolverJob(_Job):
+    """:func:`roll_plan.solver.solve` and the comparison of its plan with
+    random plans, in a daemon thread.
+
+    ``phase`` is "searching" then "comparing", and ``evaluations`` counts the
+    plans searched so far. A job cancelled while searching keeps the best
+    plan found so far and skips the comparison.
+    """
+
+    def __init__(self, cutplan: Cutplan, rolls: Sequence[Roll], time_budget: float,
+                 compare_budget: float, seed: Optional[int] = None):
+        super().__init__()
+        self.cutplan = cutplan
+        self.rolls = rolls
+        self.time_budget = time_budget
+        self.compare_budget = compare_budget
+        self.seed = seed
+        self.phase = "searching"
+        self.evaluations = 0
+        self.result: Optional[SolverResult] = None
+
+    def _stop(self, evaluations, elapsed):
+        self.evaluations = evaluations
+        return self.cancelled
+
+    def _work(self):
+        solution = solve(self.cutplan, self.rolls, self.time_budget, self.seed, stop=self._stop)
+        self.evaluations = solution.evaluations
+        if self.cancelled:
+            return solution, "cancelled"
+        self.phase = "comparing"
+        compare_with_random(solution, self.rolls, self.compare_budget, seed=self.seed,
+                            stop=lambda iterations, elapsed: self.cancelled)
+        return solution, "done"
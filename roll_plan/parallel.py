@@ -0,0 +1,110 @@
+"""Running iterations across a pool of worker processes.
+
+Iterations are split into fixed-size batches, each with its own seed spawned
+from the run's seed (see :func:`roll_plan.vectorized.batch_seeds`). The batch
+layout does not depend on the number of workers, so a given seed and batch
+size give the same results however many processes run them.
+"""
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+from .engine import DEFAULT_ITERATIONS, Cutplan, Roll, SimulationResult, simulate_iteration, summarize
+from .inventory import RollInventory
+from .stats import DEFAULT_CONFIDENCE, StoppingRule, SummaryAccumulator
+from .vectorized import batch_seeds, simulate_batch
+
+# Iterations per task; small enough to keep every worker busy
+DEFAULT_SCALAR_BATCH_SIZE = 16
+DEFAULT_VECTORIZED_BATCH_SIZE = 256
+
+# Inputs of the current run, set once per worker process by _init_worker
+_worker_inputs = None
+
+
+def _init_worker(cutplan, rolls, vectorized):
+    global _worker_inputs
+    if vectorized:
+        _worker_inputs = (cutplan, [length for _, length in rolls], vectorized)
+    else:
+        _worker_inputs = (cutplan, RollInventory.from_rolls(rolls), vectorized)
+
+
+def _run_batch(batch_iterations, batch_seed):
+    # Simulate one batch and return its statistics, so the parent only merges
+    # accumulators. Without their random generators (see RunningStat's
+    # __getstate__) they pickle to a few kilobytes, about the size of a scalar
+    # batch's iteration results
+    import numpy as np
+
+    cutplan, rolls, vectorized = _worker_inputs
+    stats = SummaryAccumulator(cutplan.max_bundles)
+    if vectorized:
+        rng = np.random.default_rng(batch_seed)
+        stats.add_batch(simulate_batch(cutplan, rolls, batch_iterations, rng))
+    else:
+        rng = random.Random(int(batch_seed.generate_state(1, np.uint64)[0]))
+        for _ in range(batch_iterations):
+            stats.add(simulate_iteration(cutplan, rolls, rng))
+    return stats
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def run_parallel(cutplan: Cutplan, rolls: Sequence[Roll],
+                 num_iterations: int = DEFAULT_ITERATIONS,
+                 seed: Optional[int] = None,
+                 workers: Optional[int] = None,
+                 vectorized: bool = False,
+                 batch_size: Optional[int] = None,
+                 stopping: Optional[StoppingRule] = None) -> SimulationResult:
+    """Run random roll plans in ``workers`` processes and summarize them.
+
+    ``workers`` defaults to the number of CPUs; with a single worker the
+    batches run in this process. The cutplan and rolls are sent to each
+    worker once, tasks only carry a batch size and seed. A ``stopping`` rule
+    is checked as each batch is merged, in batch order, and cancels the
+    batches not yet started.
+    """
+    if workers is None:
+        workers = default_workers()
+    if batch_size is None:
+        batch_size = DEFAULT_VECTORIZED_BATCH_SIZE if vectorized else DEFAULT_SCALAR_BATCH_SIZE
+    batches = list(batch_seeds(num_iterations, seed, batch_size))
+    workers = max(1, min(workers, len(batches)))
+
+    stats = SummaryAccumulator(cutplan.max_bundles)
+    stop_reason = None
+    started = time.perf_counter()
+    executor = None
+    if workers == 1:
+        _init_worker(cutplan, rolls, vectorized)
+        batch_results = (_run_batch(*batch) for batch in batches)
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(cutplan, rolls, vectorized))
+        # Results come back in batch order whichever worker finishes first
+        batch_results = executor.map(_run_batch, *zip(*batches))
+
+    try:
+        for batch_stats in batch_results:
+            stats.merge(batch_stats)
+            if stopping is not None:
+                stop_reason = stopping.stop_reason(stats, cutplan.total_fabric_needed,
+                                                   time.perf_counter() - started)
+                if stop_reason:
+                    break
+        else:
+            if stopping is not None:
+                stop_reason = "max_iterations"
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    confidence = stopping.confidence if stopping is not None else DEFAULT_CONFIDENCE
+    summary = summarize(cutplan, rolls, stats, confidence)
+    return SimulationResult(summary, stats, stop_reason=stop_reason)
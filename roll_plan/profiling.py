@@ -0,0 +1,139 @@
+"""Opt-in timing of the phases of a run.
+
+Pass a :class:`Profiler` to :func:`roll_plan.engine.run_simulation` (or
+:func:`~roll_plan.engine.simulate_iteration`) to record wall time and call
+counts per phase and per marker, and how many rolls each marker examined and
+cut. Without a profiler the engine only pays for a few ``is None`` checks
+per marker.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+
+# Phases in the order a run goes through them. The three passes are the
+# per-marker allocation steps of simulate_iteration; "render" covers progress
+# callbacks and whatever the caller times itself, such as the app's output.
+PHASES = (
+    "read_input",
+    "residual_pass",
+    "regular_pass",
+    "leftover_residual_pass",
+    "classify_end_bits",
+    "accumulate_stats",
+    "render",
+)
+
+# The passes timed for every marker
+MARKER_PHASES = PHASES[1:4]
+
+
+class MarkerProfile:
+    """Totals for one marker over all profiled iterations."""
+
+    __slots__ = ("calls", "seconds", "phase_seconds", "rolls_examined", "rolls_used",
+                 "skipped")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.phase_seconds = [0.0] * len(MARKER_PHASES)
+        self.rolls_examined = 0
+        self.rolls_used = 0
+        # Iterations where no roll was long enough for a single ply
+        self.skipped = 0
+
+
+class Profiler:
+    """Wall time and call counts per phase and per marker."""
+
+    def __init__(self):
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.markers = []
+        self.marker_names = None
+        self._started = time.perf_counter()
+
+    def add(self, phase, seconds, calls=1):
+        self.calls[phase] += calls
+        self.seconds[phase] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def marker(self, marker_index):
+        while len(self.markers) <= marker_index:
+            self.markers.append(MarkerProfile())
+        return self.markers[marker_index]
+
+    def add_marker(self, marker_index, started, residual_done, regular_done, leftover_done,
+                   rolls_examined, rolls_used):
+        """Record one marker of one iteration from the clock readings at its phase ends."""
+        marker = self.marker(marker_index)
+        marker.calls += 1
+        marker.seconds += leftover_done - started
+        marker.rolls_examined += rolls_examined
+        marker.rolls_used += rolls_used
+        for i, (phase, phase_started, phase_done) in enumerate(zip(
+                MARKER_PHASES, (started, residual_done, regular_done),
+                (residual_done, regular_done, leftover_done))):
+            marker.phase_seconds[i] += phase_done - phase_started
+            self.seconds[phase] += phase_done - phase_started
+            self.calls[phase] += 1
+
+    def skip_marker(self, marker_index):
+        marker = self.marker(marker_index)
+        marker.calls += 1
+        marker.skipped += 1
+
+    def phase_table(self):
+        """Rows of phase, calls, total and mean milliseconds and share of the wall time."""
+        elapsed = time.perf_counter() - self._started
+        rows = []
+        for phase in PHASES:
+            calls, seconds = self.calls[phase], self.seconds[phase]
+            rows.append({
+                "Phase": phase,
+                "Calls": calls,
+                "Total (ms)": round(seconds * 1000, 3),
+                "Mean (ms)": round(seconds * 1000 / calls, 4) if calls else None,
+                "Share of wall time %": round(seconds / elapsed * 100, 1) if elapsed else None,
+            })
+        return rows
+
+    def marker_table(self):
+        rows = []
+        for i, marker in enumerate(self.markers):
+            name = self.marker_names[i] if self.marker_names else i + 1
+            row = {
+                "Marker": name,
+                "Calls": marker.calls,
+                "Total (ms)": round(marker.seconds * 1000, 3),
+            }
+            for phase, seconds in zip(MARKER_PHASES, marker.phase_seconds):
+                row[f"{phase} (ms)"] = round(seconds * 1000, 3)
+            row.update({
+                "Rolls examined": marker.rolls_examined,
+                "Rolls used": marker.rolls_used,
+                "No roll long enough": marker.skipped,
+            })
+            rows.append(row)
+        return rows
+
+    def report(self):
+        """Everything recorded, as JSON-ready data."""
+        return {
+            "wall_seconds": time.perf_counter() - self._started,
+            "phases": self.phase_table(),
+            "markers": self.marker_table(),
+            "rolls_examined": sum(marker.rolls_examined for marker in self.markers),
+            "rolls_used": sum(marker.rolls_used for marker in self.markers),
+        }
+
+
+def phase(profiler, name):
+    """``profiler.phase(name)``, or a no-op context when not profiling."""
+    return nullcontext() if profiler is None else profiler.phase(name)
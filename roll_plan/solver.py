@@ -0,0 +1,378 @@
+"""Searching for a low-waste roll plan instead of sampling random ones.
+
+A roll plan is fixed by the order the regular rolls are tried in at each
+marker; residuals are always taken longest first. The solver starts from
+the better of two best-fit-decreasing orders, which at every marker try
+first the rolls leaving the smallest remainder after their last full ply,
+longest first: one counts remainders long enough for another marker as no
+remainder, which keeps waste low, the other counts every remainder, which
+tends to cut more plies when fabric is short. It then improves the plan by
+local search until the time budget is spent. A move swaps a roll cut for a
+marker with one that was not, or changes which of a marker's rolls is cut
+last. Only the markers from the changed one onwards are re-simulated, by
+resuming from the plan's checkpoint there (see :mod:`roll_plan.incremental`).
+
+The best-fit order at a marker is only sorted when a plan first reaches it.
+At least one seed plan is always simulated, so on very large orders the
+search can overrun a short budget by about the time one plan takes.
+
+Plans are ranked by shortfall quantity, then by unusable bits.
+"""
+import random
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+from .engine import Cutplan, IterationResult, Roll, resume_iteration, simulate_iteration
+from .inventory import RollInventory, to_fixed
+
+DEFAULT_TIME_BUDGET = 10.0
+
+# Chance a move reorders a marker's rolls rather than swapping one out
+_REORDER_PROBABILITY = 0.2
+
+# The fit keys pack the remainder above the length, which is far below 2**48
+# thousandths of a unit; an int sorts faster than a (remainder, -length) tuple
+_LENGTH_BITS = 48
+
+
+def _reusable_fit(length, marker_length, smallest_marker):
+    remainder = length % marker_length
+    return ((remainder if remainder < smallest_marker else 0) << _LENGTH_BITS) - length
+
+
+def _strict_fit(length, marker_length, smallest_marker):
+    return ((length % marker_length) << _LENGTH_BITS) - length
+
+
+# Best-fit-decreasing sort keys the search is seeded from
+SEED_HEURISTICS = {"reusable-remainder": _reusable_fit, "remainder": _strict_fit}
+
+
+def plan_cost(result: IterationResult):
+    """Sort key of a plan: garments short first, then unusable fabric."""
+    return (result.shortfall_quantity, result.unusable_bits)
+
+
+@dataclass
+class SolverResult:
+    """The best plan found and how the search went."""
+
+    cutplan: Cutplan
+    result: IterationResult
+    # Per marker, the plies laid and the names of the pieces cut for it
+    plies: List[int]
+    pieces: List[List[str]]
+    seed_result: IterationResult
+    seed_heuristic: str
+    evaluations: int
+    improvements: int
+    elapsed: float
+    comparison: Optional["RandomComparison"] = None
+
+    def plan_table(self):
+        """Rows of the roll plan, one per marker."""
+        return [{
+            "Marker": name,
+            "Plies Planned": ply_height,
+            "Plies Laid": plies,
+            "Rolls Used": ", ".join(pieces),
+        } for name, ply_height, plies, pieces in zip(
+            self.cutplan.marker_names, self.cutplan.ply_heights, self.plies, self.pieces)]
+
+
+@dataclass
+class RandomComparison:
+    """Where the solver's plan falls in the distribution of random plans."""
+
+    iterations: int
+    elapsed: float
+    mean_unusable_bits: float
+    mean_shortfall_quantity: float
+    best_unusable_bits: float
+    best_shortfall_quantity: int
+    # Share of random plans worse than the solver's
+    worse_share: float
+
+
+class _Plan:
+    """Roll priorities per marker and the simulated outcome they give."""
+
+    __slots__ = ("priorities", "inventory", "checkpoints", "result", "cost")
+
+    def __init__(self, priorities, inventory, checkpoints, result):
+        self.priorities = priorities
+        self.inventory = inventory
+        self.checkpoints = checkpoints
+        self.result = result
+        self.cost = plan_cost(result)
+
+
+class _Search:
+    def __init__(self, cutplan, rolls, rng):
+        self.cutplan = cutplan
+        self.rng = rng
+        self.inventory = RollInventory.from_rolls(rolls)
+        self.num_rolls = self.inventory.num_rolls
+        self.marker_lengths = [to_fixed(length) for length in cutplan.marker_lengths]
+        self.smallest_marker = min(self.marker_lengths)
+        self.evaluations = 0
+        self.fit = self.fit_orders = None
+        self._fit_orders_by_heuristic = {}
+
+    def use_heuristic(self, name):
+        """Try the rolls without a priority at a marker in the best-fit order
+        of the seed heuristic ``name``.
+
+        The orders of each heuristic are kept, so switching back is free.
+        """
+        self.fit = SEED_HEURISTICS[name]
+        self.fit_orders = self._fit_orders_by_heuristic.setdefault(
+            name, [None] * len(self.marker_lengths))
+
+    def drop_heuristics(self, keep):
+        """Free the orders of every heuristic but ``keep``."""
+        self._fit_orders_by_heuristic = {keep: self._fit_orders_by_heuristic[keep]}
+
+    def fit_order(self, marker_index):
+        """The rolls long enough for the marker, in best-fit order.
+
+        Sorted the first time a plan reaches the marker; shorter rolls are
+        never cut for it, so they are left out.
+        """
+        order = self.fit_orders[marker_index]
+        if order is None:
+            lengths = self.inventory.lengths
+            marker_length = self.marker_lengths[marker_index]
+            fit = self.fit
+            smallest_marker = self.smallest_marker
+            order = array("i", sorted(
+                (roll_id for roll_id in range(self.num_rolls) if lengths[roll_id] >= marker_length),
+                key=lambda roll_id: fit(lengths[roll_id], marker_length, smallest_marker)))
+            self.fit_orders[marker_index] = order
+        return order
+
+    def _order_key(self, priority, marker_index):
+        # Rolls with a priority at the marker go first, in that order, then the
+        # rest in best-fit-decreasing order. Sorting ids in ascending order by
+        # this key breaks ties by id, as the sort in fit_order does.
+        num_rolls = self.num_rolls
+        lengths = self.inventory.lengths
+        marker_length = self.marker_lengths[marker_index]
+        fit = self.fit
+        smallest_marker = self.smallest_marker
+        return lambda roll_id: (priority.get(roll_id, num_rolls),
+                                fit(lengths[roll_id], marker_length, smallest_marker))
+
+    def _shuffle(self, priorities):
+        # The same order as sorting by _order_key, built in linear time from
+        # the best-fit order, with the rolls too short for the marker last
+        present = bytearray(self.num_rolls)
+
+        def shuffle(roll_ids, marker_index):
+            if not roll_ids:
+                return
+            for roll_id in roll_ids:
+                present[roll_id] = 1
+            priority = priorities[marker_index]
+            head = [roll_id for roll_id in sorted(priority, key=priority.__getitem__)
+                    if present[roll_id]]
+            for roll_id in head:
+                present[roll_id] = 0
+            fitting = [roll_id for roll_id in self.fit_order(marker_index) if present[roll_id]]
+            for roll_id in fitting:
+                present[roll_id] = 0
+            too_short = [roll_id for roll_id in roll_ids if present[roll_id]]
+            for roll_id in too_short:
+                present[roll_id] = 0
+            roll_ids[:] = head + fitting + too_short
+        return shuffle
+
+    def evaluate(self, priorities, base=None, first_marker=0):
+        """Simulate the plan, resuming from ``base``'s checkpoint when given."""
+        self.evaluations += 1
+        if base is None:
+            inventory = self.inventory.fresh()
+            checkpoints = []
+            totals = (0, 0, 0)
+        else:
+            pieces, *totals = base.checkpoints[first_marker]
+            inventory = base.inventory.rewind(pieces, first_marker)
+            checkpoints = base.checkpoints[:first_marker]
+        result = resume_iteration(self.cutplan, inventory, first_marker, tuple(totals),
+                                  self._shuffle(priorities), checkpoints)
+        return _Plan(priorities, inventory, checkpoints, result)
+
+    def cut_at(self, plan, marker_index):
+        """Regular rolls cut for the marker, in the order they were tried."""
+        used = plan.inventory.used
+        stamp = marker_index + 1
+        cut = [roll_id for roll_id in range(self.num_rolls) if used[roll_id] == stamp]
+        cut.sort(key=self._order_key(plan.priorities[marker_index], marker_index))
+        return cut
+
+    def neighbour(self, plan):
+        """A random move from ``plan``: new priorities and the marker it changes."""
+        rng = self.rng
+        marker_index = rng.randrange(len(self.cutplan))
+        cut = self.cut_at(plan, marker_index)
+        if not cut:
+            return None
+        if len(cut) > 1 and rng.random() < _REORDER_PROBABILITY:
+            # Change which roll is cut last, and so left with the residual
+            i, j = rng.sample(range(len(cut)), 2)
+            cut[i], cut[j] = cut[j], cut[i]
+        else:
+            # Swap a roll cut here for one that was still uncut at this marker
+            used = plan.inventory.used
+            lengths = plan.inventory.lengths
+            marker_length = self.marker_lengths[marker_index]
+            stamp = marker_index + 1
+            candidates = [roll_id for roll_id in range(self.num_rolls)
+                          if (used[roll_id] == 0 or used[roll_id] > stamp)
+                          and lengths[roll_id] >= marker_length]
+            if not candidates:
+                return None
+            cut[rng.randrange(len(cut))] = rng.choice(candidates)
+
+        priorities = list(plan.priorities)
+        priorities[marker_index] = {roll_id: rank for rank, roll_id in enumerate(cut)}
+        return priorities, marker_index
+
+    def pin(self, plan):
+        """Make the plan's priorities name exactly the rolls it cuts at each marker.
+
+        Re-simulating a pinned plan gives the same result whatever the
+        priorities of earlier markers were.
+        """
+        cut = [[] for _ in range(len(self.cutplan))]
+        used = plan.inventory.used
+        for roll_id in range(self.num_rolls):
+            if used[roll_id]:
+                cut[used[roll_id] - 1].append(roll_id)
+        priorities = []
+        for marker_index, roll_ids in enumerate(cut):
+            roll_ids.sort(key=self._order_key(plan.priorities[marker_index], marker_index))
+            priorities.append({roll_id: rank for rank, roll_id in enumerate(roll_ids)})
+        plan.priorities = priorities
+
+
+def solve(cutplan: Cutplan, rolls: Sequence[Roll], time_budget: float = DEFAULT_TIME_BUDGET,
+          seed: Optional[int] = None, max_evaluations: Optional[int] = None,
+          stop: Optional[Callable[[int, float], bool]] = None) -> SolverResult:
+    """Search for the roll plan with the least shortfall and unusable fabric.
+
+    Runs until ``time_budget`` seconds have passed or ``max_evaluations``
+    plans have been simulated. ``stop`` is called with the number of plans
+    simulated and the seconds elapsed after every plan, and ends the search
+    with the best plan so far when it returns True.
+    """
+    started = time.perf_counter()
+    search = _Search(cutplan, rolls, random.Random(seed))
+
+    def out_of_time():
+        elapsed = time.perf_counter() - started
+        return (elapsed >= time_budget
+                or (max_evaluations is not None and search.evaluations >= max_evaluations)
+                or (stop is not None and stop(search.evaluations, elapsed)))
+
+    # The second heuristic is only tried when the first left time for it
+    current = seed_heuristic = None
+    for name in SEED_HEURISTICS:
+        search.use_heuristic(name)
+        plan = search.evaluate([{} for _ in range(len(cutplan))])
+        if current is None or plan.cost < current.cost:
+            current, seed_heuristic = plan, name
+        if out_of_time():
+            break
+    search.use_heuristic(seed_heuristic)
+    search.drop_heuristics(seed_heuristic)
+    search.pin(current)
+    seed_result = current.result
+    improvements = 0
+
+    while not out_of_time():
+        move = search.neighbour(current)
+        if move is None:
+            continue
+        priorities, marker_index = move
+        candidate = search.evaluate(priorities, current, marker_index)
+        # Sideways moves are accepted too, to drift across plateaus
+        if candidate.cost <= current.cost:
+            if candidate.cost < current.cost:
+                improvements += 1
+            search.pin(candidate)
+            current = candidate
+
+    return SolverResult(
+        cutplan=cutplan,
+        result=current.result,
+        plies=_plies_per_marker(cutplan, current.checkpoints),
+        pieces=_pieces_per_marker(cutplan, current.inventory),
+        seed_result=seed_result,
+        seed_heuristic=seed_heuristic,
+        evaluations=search.evaluations,
+        improvements=improvements,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def _plies_per_marker(cutplan, checkpoints):
+    # Running ply shortfall is the second checkpoint field
+    return [ply_height - (after[1] - before[1])
+            for ply_height, before, after in zip(cutplan.ply_heights, checkpoints, checkpoints[1:])]
+
+
+def _pieces_per_marker(cutplan, inventory):
+    pieces = [[] for _ in range(len(cutplan))]
+    for piece_id, stamp in enumerate(inventory.used):
+        if stamp:
+            pieces[stamp - 1].append(inventory.name(piece_id))
+    return pieces
+
+
+def compare_with_random(solution: SolverResult, rolls: Sequence[Roll],
+                        time_budget: Optional[float] = None, iterations: Optional[int] = None,
+                        seed: Optional[int] = None,
+                        stop: Optional[Callable[[int, float], bool]] = None) -> RandomComparison:
+    """Sample random plans and place the solver's plan among them.
+
+    Samples for ``time_budget`` seconds (by default as long as the solver
+    ran), or exactly ``iterations`` plans when that is given. ``stop`` is
+    called as in :func:`solve` and ends the sampling early, after at least
+    one plan, when it returns True.
+    """
+    if time_budget is None:
+        time_budget = solution.elapsed
+    cutplan = solution.cutplan
+    rng = random.Random(seed)
+    inventory = RollInventory.from_rolls(rolls)
+    best_cost = plan_cost(solution.result)
+
+    results = []
+    started = time.perf_counter()
+    while True:
+        if iterations is not None:
+            if len(results) >= iterations:
+                break
+        elif results and time.perf_counter() - started >= time_budget:
+            break
+        if results and stop is not None and stop(len(results), time.perf_counter() - started):
+            break
+        results.append(simulate_iteration(cutplan, inventory, rng))
+    elapsed = time.perf_counter() - started
+
+    costs = [plan_cost(result) for result in results]
+    best_random = min(results, key=plan_cost)
+    comparison = RandomComparison(
+        iterations=len(results),
+        elapsed=elapsed,
+        mean_unusable_bits=round(sum(r.unusable_bits for r in results) / len(results), 3),
+        mean_shortfall_quantity=round(sum(r.shortfall_quantity for r in results) / len(results), 1),
+        best_unusable_bits=best_random.unusable_bits,
+        best_shortfall_quantity=best_random.shortfall_quantity,
+        worse_share=sum(cost > best_cost for cost in costs) / len(costs),
+    )
+    solution.comparison = comparison
+    return comparison
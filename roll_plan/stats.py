@@ -0,0 +1,293 @@
+"""Streaming statistics over roll-plan iterations.
+
+Accumulators use constant memory however many iterations are run, and can
+be merged, so batches simulated in separate processes combine into one
+summary.
+"""
+import math
+import random
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Optional
+
+from .inventory import LENGTH_SCALE
+
+# Values kept per metric for estimating percentiles
+RESERVOIR_SIZE = 512
+
+DEFAULT_CONFIDENCE = 0.95
+
+
+class RunningStat:
+    """Running count, mean, variance, range and percentiles of one metric.
+
+    The mean comes from an exact integer total of ``value * scale``, so it does
+    not depend on the order values are added or merged in. The variance uses
+    Welford's update. Percentiles are estimated from a fixed-size uniform
+    reservoir sample.
+    """
+
+    __slots__ = ("scale", "reservoir_size", "count", "total", "minimum", "maximum",
+                 "_mean", "_m2", "_reservoir", "_rng")
+
+    def __init__(self, scale=1, reservoir_size=RESERVOIR_SIZE):
+        self.scale = scale
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.total = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._reservoir = []
+        self._rng = random.Random(0)
+
+    def __getstate__(self):
+        # The generator's state is larger than everything else put together,
+        # and only matters to the side merging, so it is not sent between
+        # processes
+        return {name: getattr(self, name) for name in self.__slots__ if name != "_rng"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._rng = random.Random(self.count)
+
+    def add(self, value):
+        self.count += 1
+        self.total += round(value * self.scale)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+        if len(self._reservoir) < self.reservoir_size:
+            self._reservoir.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < self.reservoir_size:
+                self._reservoir[slot] = value
+
+    def add_many(self, values):
+        """Add a batch of values, faster than adding them one by one.
+
+        NumPy arrays are summarized with array operations rather than being
+        converted to lists first.
+        """
+        if hasattr(values, "dtype"):
+            self._add_array(values)
+            return
+        values = list(values)
+        if not values:
+            return
+        batch = RunningStat(self.scale, self.reservoir_size)
+        batch.count = len(values)
+        batch.total = sum(round(value * self.scale) for value in values)
+        batch._mean = math.fsum(values) / batch.count
+        batch._m2 = math.fsum((value - batch._mean) ** 2 for value in values)
+        batch.minimum = min(values)
+        batch.maximum = max(values)
+        if len(values) <= self.reservoir_size:
+            batch._reservoir = values
+        else:
+            batch._reservoir = self._rng.sample(values, self.reservoir_size)
+        self.merge(batch)
+
+    def _add_array(self, values):
+        if not len(values):
+            return
+        batch = RunningStat(self.scale, self.reservoir_size)
+        batch.count = len(values)
+        batch.total = int((values * self.scale).round().astype("int64").sum())
+        batch._mean = float(values.mean())
+        batch._m2 = float(((values - batch._mean) ** 2).sum())
+        batch.minimum = values.min().item()
+        batch.maximum = values.max().item()
+        if len(values) <= self.reservoir_size:
+            batch._reservoir = values.tolist()
+        else:
+            # Picks the same positions as sampling the values as a list would
+            picked = self._rng.sample(range(len(values)), self.reservoir_size)
+            batch._reservoir = values[picked].tolist()
+        self.merge(batch)
+
+    def merge(self, other):
+        """Fold another accumulator of the same metric into this one."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.total = other.count, other.total
+            self.minimum, self.maximum = other.minimum, other.maximum
+            self._mean, self._m2 = other._mean, other._m2
+            self._reservoir = list(other._reservoir)
+            return
+        count = self.count + other.count
+
+        # Combine the variances (Chan et al.)
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self._mean += delta * other.count / count
+
+        # Keep reservoir values from each side in proportion to its count
+        size = min(self.reservoir_size, len(self._reservoir) + len(other._reservoir))
+        from_self = min(len(self._reservoir), round(size * self.count / count))
+        from_other = min(len(other._reservoir), size - from_self)
+        from_self = size - from_other
+        self._reservoir = (self._rng.sample(self._reservoir, from_self)
+                           + self._rng.sample(other._reservoir, from_other))
+
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def mean(self):
+        return self.total / self.scale / self.count if self.count else 0.0
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def margin(self, confidence=DEFAULT_CONFIDENCE):
+        """Half-width of the normal confidence interval on the mean."""
+        if self.count < 2:
+            return math.inf
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * self.std / math.sqrt(self.count)
+
+    def percentile(self, q):
+        """Estimated ``q``-th percentile (0-100), interpolating linearly."""
+        if not self._reservoir:
+            return math.nan
+        values = sorted(self._reservoir)
+        position = (len(values) - 1) * q / 100
+        lower = math.floor(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def describe(self, confidence=DEFAULT_CONFIDENCE):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "margin": self.margin(confidence) if self.count > 1 else None,
+            "min": self.minimum if self.count else None,
+            "p5": self.percentile(5) if self.count else None,
+            "p50": self.percentile(50) if self.count else None,
+            "p95": self.percentile(95) if self.count else None,
+            "max": self.maximum if self.count else None,
+        }
+
+
+# Per-iteration metrics and the scale making their values whole numbers.
+# "wastage" is usable plus unusable end bits.
+METRICS = (
+    ("excess_rolls", LENGTH_SCALE),
+    ("fabric_saved_in_roll_form", LENGTH_SCALE),
+    ("usable_end_bits", LENGTH_SCALE),
+    ("unusable_bits", LENGTH_SCALE),
+    ("wastage", LENGTH_SCALE),
+    ("total_ply_shortfall", 1),
+    ("shortfall_quantity", 1),
+    ("garments_produced", 1),
+)
+
+
+class SummaryAccumulator:
+    """Running statistics of every summary metric and end bit group."""
+
+    def __init__(self, max_bundles):
+        self.metrics = {name: RunningStat(scale) for name, scale in METRICS}
+        self.end_bits_group_counts = [RunningStat() for _ in range(max_bundles)]
+        self.end_bits_group_sums = [RunningStat(LENGTH_SCALE) for _ in range(max_bundles)]
+
+    @classmethod
+    def from_iterations(cls, max_bundles, iterations):
+        stats = cls(max_bundles)
+        for result in iterations:
+            stats.add(result)
+        return stats
+
+    def __len__(self):
+        return self.metrics["excess_rolls"].count
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def add(self, result):
+        """Add one :class:`roll_plan.engine.IterationResult`."""
+        for name, stat in self.metrics.items():
+            if name == "wastage":
+                stat.add(result.usable_end_bits + result.unusable_bits)
+            else:
+                stat.add(getattr(result, name))
+        for stat, value in zip(self.end_bits_group_counts, result.end_bits_group_counts):
+            stat.add(value)
+        for stat, value in zip(self.end_bits_group_sums, result.end_bits_group_sums):
+            stat.add(value)
+
+    def add_batch(self, batch):
+        """Add a :class:`roll_plan.vectorized.BatchResult`, column by column."""
+        for name, stat in self.metrics.items():
+            if name == "wastage":
+                stat.add_many(batch.usable_end_bits + batch.unusable_bits)
+            else:
+                stat.add_many(getattr(batch, name))
+        for i, stat in enumerate(self.end_bits_group_counts):
+            stat.add_many(batch.end_bits_group_counts[:, i])
+        for i, stat in enumerate(self.end_bits_group_sums):
+            stat.add_many(batch.end_bits_group_sums[:, i])
+
+    def merge(self, other):
+        for name, stat in self.metrics.items():
+            stat.merge(other.metrics[name])
+        for stat, other_stat in zip(self.end_bits_group_counts, other.end_bits_group_counts):
+            stat.merge(other_stat)
+        for stat, other_stat in zip(self.end_bits_group_sums, other.end_bits_group_sums):
+            stat.merge(other_stat)
+
+    def describe(self, confidence=DEFAULT_CONFIDENCE):
+        return {
+            "metrics": {name: stat.describe(confidence) for name, stat in self.metrics.items()},
+            "end_bits_group_counts": [stat.describe(confidence) for stat in self.end_bits_group_counts],
+            "end_bits_group_sums": [stat.describe(confidence) for stat in self.end_bits_group_sums],
+        }
+
+
+@dataclass
+class StoppingRule:
+    """When an adaptive run has sampled enough.
+
+    A run stops once the confidence intervals on wastage % (in percentage
+    points) and shortfall quantity (in garments) are narrower than the
+    tolerances that are set, or once ``time_budget`` seconds have passed.
+    """
+
+    wastage_tolerance: Optional[float] = None
+    shortfall_tolerance: Optional[float] = None
+    time_budget: Optional[float] = None
+    min_iterations: int = 10
+    confidence: float = DEFAULT_CONFIDENCE
+
+    def stop_reason(self, stats: SummaryAccumulator, total_fabric_needed, elapsed):
+        """Why the run should stop now, or None to keep sampling."""
+        if self.time_budget is not None and elapsed >= self.time_budget:
+            return "time_budget"
+        if len(stats) < self.min_iterations:
+            return None
+        if self.wastage_tolerance is None and self.shortfall_tolerance is None:
+            return None
+        if self.wastage_tolerance is not None:
+            wastage_margin = stats["wastage"].margin(self.confidence) * 100 / total_fabric_needed
+            if wastage_margin > self.wastage_tolerance:
+                return None
+        if self.shortfall_tolerance is not None:
+            if stats["shortfall_quantity"].margin(self.confidence) > self.shortfall_tolerance:
+                return None
+        return "converged"
@@ -0,0 +1,281 @@
+"""Sweeping many orders over a grid of planning parameters.
+
+A sweep simulates every input (a cutplan and its rolls) under every
+combination of:
+
+* roll-order policy: ``random`` roll plans as in the app, or one
+  deterministic plan trying the regular rolls ``longest-first``,
+  ``shortest-first`` or ``best-fit`` (the solver's best-fit-decreasing order,
+  see :data:`roll_plan.solver.SEED_HEURISTICS`) at every marker;
+* inventory trim: the share of the shortest rolls left out of the inventory;
+* fabric allowance for the shortage warning.
+
+The allowance does not change how rolls are cut, so each (input, policy,
+trim) is simulated once and gives a table row per allowance. Simulations run
+in a process pool that receives the inputs once per worker, longest first,
+and rows are reported as each finishes. With a ``cache_dir``, finished
+simulations are stored as JSON keyed on the inputs' contents and the
+simulation parameters, and are not run again by later sweeps.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .engine import (
+    DEFAULT_ITERATIONS,
+    FABRIC_ALLOWANCE,
+    Cutplan,
+    Roll,
+    run_simulation,
+    simulate_iteration,
+    summarize,
+)
+from .inventory import RollInventory, to_fixed
+from .solver import SEED_HEURISTICS
+
+ORDER_POLICIES = ("random", "longest-first", "shortest-first", "best-fit")
+
+# Columns of the consolidated table, in order
+COLUMNS = (
+    "input", "order", "trim", "allowance", "rolls", "rolls_trimmed", "iterations",
+    "total_fabric_needed", "total_fabric_uploaded", "fabric_needed_with_allowance",
+    "insufficient_fabric", "wastage_percentage", "wastage_percentage_margin",
+    "avg_shortfall_quantity", "shortfall_quantity_margin", "shortfall_percentage",
+    "avg_unusable_fabric", "avg_usable_end_bits", "avg_excess_rolls", "elapsed_seconds",
+    "cached",
+)
+
+# Bump when the simulation changes so stale cached results are not reused
+_CACHE_VERSION = "1"
+
+
+@dataclass(frozen=True)
+class SweepTask:
+    """One simulation of a sweep."""
+
+    input_name: str
+    order: str
+    trim: float
+
+
+def trim_rolls(rolls: Sequence[Roll], share: float) -> List[Roll]:
+    """The rolls without the shortest ``share`` of them, in their original order."""
+    if not 0 <= share < 1:
+        raise ValueError(f"Trim must be at least 0 and below 1, got {share}")
+    num_trimmed = round(len(rolls) * share)
+    if not num_trimmed:
+        return list(rolls)
+    shortest = sorted(range(len(rolls)), key=lambda roll_id: rolls[roll_id][1])[:num_trimmed]
+    trimmed = set(shortest)
+    return [roll for roll_id, roll in enumerate(rolls) if roll_id not in trimmed]
+
+
+def order_shuffle(order: str, cutplan: Cutplan, inventory: RollInventory):
+    """Shuffle hook for :func:`roll_plan.engine.simulate_iteration` putting the
+    regular rolls in a deterministic ``order``; None for ``random``.
+    """
+    if order == "random":
+        return None
+    lengths = inventory.lengths
+    if order == "longest-first":
+        return lambda roll_ids, marker_index: roll_ids.sort(key=lambda roll_id: -lengths[roll_id])
+    if order == "shortest-first":
+        return lambda roll_ids, marker_index: roll_ids.sort(key=lengths.__getitem__)
+    if order == "best-fit":
+        fit = SEED_HEURISTICS["reusable-remainder"]
+        marker_lengths = [to_fixed(length) for length in cutplan.marker_lengths]
+        smallest_marker = min(marker_lengths)
+
+        def shuffle(roll_ids, marker_index):
+            marker_length = marker_lengths[marker_index]
+            roll_ids.sort(key=lambda roll_id: fit(lengths[roll_id], marker_length,
+                                                  smallest_marker))
+        return shuffle
+    raise ValueError(f"Unknown roll order {order!r}, expected one of {', '.join(ORDER_POLICIES)}")
+
+
+def simulate_task(cutplan: Cutplan, rolls: Sequence[Roll], order: str, trim: float,
+                  num_iterations: int = DEFAULT_ITERATIONS, seed: Optional[int] = None):
+    """Simulate one (policy, trim) combination and return a JSON-ready record.
+
+    Deterministic orders give the same plan every time, so they run once.
+    """
+    started = time.perf_counter()
+    rolls = trim_rolls(rolls, trim)
+    if order == "random":
+        summary = run_simulation(cutplan, rolls, num_iterations, seed).summary
+    else:
+        inventory = RollInventory.from_rolls(rolls)
+        result = simulate_iteration(cutplan, inventory,
+                                    shuffle=order_shuffle(order, cutplan, inventory))
+        summary = summarize(cutplan, rolls, [result])
+    return {
+        "rolls": len(rolls),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "summary": asdict(summary),
+    }
+
+
+# Inputs of the current sweep, set once per worker process by _init_worker
+_worker_inputs = None
+
+
+def _init_worker(inputs):
+    global _worker_inputs
+    _worker_inputs = inputs
+
+
+def _run_task(task, num_iterations, seed):
+    cutplan, rolls = _worker_inputs[task.input_name]
+    return simulate_task(cutplan, rolls, task.order, task.trim, num_iterations, seed)
+
+
+def inputs_digest(cutplan: Cutplan, rolls: Sequence[Roll]):
+    """Hash of the parsed inputs, whatever file format they came from."""
+    return hashlib.sha256(repr((cutplan, tuple(rolls))).encode()).hexdigest()
+
+
+def _cache_path(cache_dir, digest, task, num_iterations, seed):
+    # Deterministic orders run once whatever the iteration count and seed
+    if task.order != "random":
+        num_iterations = seed = None
+    key = hashlib.sha256(repr((_CACHE_VERSION, digest, task.order, task.trim,
+                               num_iterations, seed)).encode()).hexdigest()
+    return Path(cache_dir) / f"{key}.json"
+
+
+def _read_cached(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cached(path, record):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so a concurrent sweep never reads half a file
+    partial_path = path.with_suffix(".partial")
+    with open(partial_path, "w") as f:
+        json.dump(record, f)
+    os.replace(partial_path, path)
+
+
+def _rows(task, record, num_rolls, allowances, cached):
+    summary = record["summary"]
+    total_fabric_needed = summary["total_fabric_needed"]
+    total_fabric_uploaded = summary["total_fabric_uploaded"]
+    rows = []
+    for allowance in allowances:
+        needed_with_allowance = total_fabric_needed * (1 + allowance)
+        rows.append({
+            "input": task.input_name,
+            "order": task.order,
+            "trim": task.trim,
+            "allowance": allowance,
+            "rolls": record["rolls"],
+            "rolls_trimmed": num_rolls - record["rolls"],
+            "iterations": summary["num_iterations"],
+            "total_fabric_needed": total_fabric_needed,
+            "total_fabric_uploaded": total_fabric_uploaded,
+            "fabric_needed_with_allowance": round(needed_with_allowance, 3),
+            "insufficient_fabric": needed_with_allowance > total_fabric_uploaded,
+            "wastage_percentage": summary["wastage_percentage"],
+            "wastage_percentage_margin": summary["wastage_percentage_margin"],
+            "avg_shortfall_quantity": summary["avg_shortfall_quantity"],
+            "shortfall_quantity_margin": summary["shortfall_quantity_margin"],
+            "shortfall_percentage": summary["shortfall_percentage"],
+            "avg_unusable_fabric": summary["avg_unusable_fabric"],
+            "avg_usable_end_bits": summary["avg_usable_end_bits"],
+            "avg_excess_rolls": summary["avg_excess_rolls"],
+            "elapsed_seconds": record["elapsed_seconds"],
+            "cached": cached,
+        })
+    return rows
+
+
+def run_sweep(inputs: Mapping[str, Tuple[Cutplan, Sequence[Roll]]],
+              allowances: Sequence[float] = (FABRIC_ALLOWANCE,),
+              orders: Sequence[str] = ("random",),
+              trims: Sequence[float] = (0.0,),
+              num_iterations: int = DEFAULT_ITERATIONS,
+              seed: Optional[int] = 0,
+              workers: Optional[int] = None,
+              cache_dir: Optional[str] = None,
+              report: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """Simulate every input under every combination of the parameters.
+
+    ``inputs`` maps a name to a ``(cutplan, rolls)`` pair. Every random
+    simulation uses the same ``seed``, so the results are reproducible and
+    can be cached; with ``seed=None`` nothing is read from or written to the
+    cache. ``report`` is called with each row as soon as it is available,
+    cached rows first, and the rows are returned in grid order.
+    """
+    for order in orders:
+        if order not in ORDER_POLICIES:
+            raise ValueError(f"Unknown roll order {order!r}, "
+                             f"expected one of {', '.join(ORDER_POLICIES)}")
+    for trim in trims:
+        trim_rolls((), trim)
+    if seed is None:
+        cache_dir = None
+    if workers is None:
+        # parallel imports NumPy, which the CLI only loads when it is used
+        from .parallel import default_workers
+        workers = default_workers()
+
+    tasks = [SweepTask(name, order, trim) for name in inputs for order in orders for trim in trims]
+    digests = {name: inputs_digest(*inputs[name]) for name in inputs} if cache_dir else {}
+    rows_by_task = {}
+
+    def finish(task, record, cached):
+        rows = _rows(task, record, len(inputs[task.input_name][1]), allowances, cached)
+        if report is not None:
+            for row in rows:
+                report(row)
+        rows_by_task[task] = rows
+
+    pending = []
+    for task in tasks:
+        record = None
+        if cache_dir:
+            record = _read_cached(_cache_path(cache_dir, digests[task.input_name], task,
+                                              num_iterations, seed))
+        if record is None:
+            pending.append(task)
+        else:
+            finish(task, record, True)
+
+    def store(task, record):
+        if cache_dir:
+            _write_cached(_cache_path(cache_dir, digests[task.input_name], task,
+                                      num_iterations, seed), record)
+        finish(task, record, False)
+
+    # Start the largest simulations first so no worker is left with a long
+    # one at the end
+    def size(task):
+        cutplan, rolls = inputs[task.input_name]
+        runs = num_iterations if task.order == "random" else 1
+        return runs * len(cutplan) * len(rolls)
+    pending.sort(key=size, reverse=True)
+
+    workers = max(1, min(workers, len(pending)))
+    if workers == 1:
+        _init_worker(inputs)
+        for task in pending:
+            store(task, _run_task(task, num_iterations, seed))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(dict(inputs),)) as executor:
+            futures = {executor.submit(_run_task, task, num_iterations, seed): task
+                       for task in pending}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+
+    return [row for task in tasks for row in rows_by_task[task]]
@@ -0,0 +1,110 @@
+"""Synthetic cutplans and roll inventories for benchmarking.
+
+Roll lengths are drawn from a truncated normal distribution. The markers'
+ply heights are then scaled so the cutplan needs ``1 / fabric_ratio`` of the
+fabric uploaded: a ratio above 1 leaves surplus fabric, and one below
+``1 + FABRIC_ALLOWANCE`` triggers the insufficient-fabric warning.
+"""
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .engine import Cutplan, Roll
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    num_markers: int
+    num_rolls: int
+    fabric_ratio: float = 1.08
+    roll_length_mean: float = 60.0
+    roll_length_sd: float = 15.0
+    roll_length_min: float = 5.0
+    marker_length_range: Tuple[float, float] = (1.5, 9.0)
+    bundles_range: Tuple[int, int] = (1, 6)
+    seed: int = 0
+
+
+# Sizes spanning real orders, each with surplus and short fabric
+SCENARIOS: Dict[str, Scenario] = {}
+for _size, _markers, _rolls in (("small", 5, 40), ("medium", 50, 1000),
+                                ("large", 200, 5000), ("xlarge", 400, 15000)):
+    SCENARIOS[f"{_size}-surplus"] = Scenario(f"{_size}-surplus", _markers, _rolls, 1.08)
+    SCENARIOS[f"{_size}-shortage"] = Scenario(f"{_size}-shortage", _markers, _rolls, 0.92)
+
+
+def generate_rolls(num_rolls, rng, mean=60.0, sd=15.0, minimum=5.0) -> List[Roll]:
+    """Rolls with lengths from a normal distribution truncated at ``minimum``."""
+    rolls = []
+    for i in range(num_rolls):
+        length = rng.gauss(mean, sd)
+        while length < minimum:
+            length = rng.gauss(mean, sd)
+        rolls.append((f"R{i + 1:05d}", round(length, 2)))
+    return rolls
+
+
+def generate_cutplan(num_markers, fabric_needed, rng, marker_length_range=(1.5, 9.0),
+                     bundles_range=(1, 6)) -> Cutplan:
+    """A cutplan whose markers together need about ``fabric_needed``."""
+    marker_lengths = [round(rng.uniform(*marker_length_range), 2) for _ in range(num_markers)]
+    bundles = [rng.randint(*bundles_range) for _ in range(num_markers)]
+
+    # Share the fabric between markers at random, then turn each share into plies
+    weights = [rng.uniform(0.5, 1.5) for _ in range(num_markers)]
+    total_weight = sum(weights)
+    ply_heights = [max(1, round(fabric_needed * weight / total_weight / length))
+                   for weight, length in zip(weights, marker_lengths)]
+
+    marker_names = [f"M{i + 1:03d}" for i in range(num_markers)]
+    return Cutplan.from_columns(marker_names, marker_lengths, ply_heights, bundles)
+
+
+def generate_scenario(scenario: Scenario) -> Tuple[Cutplan, List[Roll]]:
+    rng = random.Random(scenario.seed)
+    rolls = generate_rolls(scenario.num_rolls, rng, scenario.roll_length_mean,
+                           scenario.roll_length_sd, scenario.roll_length_min)
+    fabric_uploaded = sum(length for _, length in rolls)
+    cutplan = generate_cutplan(scenario.num_markers, fabric_uploaded / scenario.fabric_ratio, rng,
+                               scenario.marker_length_range, scenario.bundles_range)
+    return cutplan, rolls
+
+
+def write_tables(cutplan: Cutplan, rolls, directory, file_format: str = "csv"):
+    """Write the inputs as cutplan and rolls_data tables loadable by the CLI."""
+    import pandas as pd
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    cutplan_df = pd.DataFrame({
+        "Marker_Name": cutplan.marker_names,
+        "Marker_Length": cutplan.marker_lengths,
+        "Ply_Height": cutplan.ply_heights,
+        "Bundles": cutplan.bundles,
+    })
+    rolls_df = pd.DataFrame(rolls, columns=["Roll_Number", "Roll_Length"])
+    for name, df in (("cutplan", cutplan_df), ("rolls_data", rolls_df)):
+        path = directory / f"{name}.{file_format}"
+        if file_format == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+
+def scenario_from_args(name: str, num_markers: Optional[int] = None,
+                       num_rolls: Optional[int] = None,
+                       fabric_ratio: Optional[float] = None,
+                       seed: Optional[int] = None) -> Scenario:
+    """A preset scenario with any of its size, ratio or seed overridden."""
+    base = SCENARIOS[name]
+    return Scenario(
+        name,
+        num_markers if num_markers is not None else base.num_markers,
+        num_rolls if num_rolls is not None else base.num_rolls,
+        fabric_ratio if fabric_ratio is not None else base.fabric_ratio,
+        base.roll_length_mean, base.roll_length_sd, base.roll_length_min,
+        base.marker_length_range, base.bundles_range,
+        seed if seed is not None else base.seed,
+    )
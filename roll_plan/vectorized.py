@@ -0,0 +1,336 @@
+"""Vectorized batch simulation of random roll plans.
+
+Every iteration of a batch is advanced through the cutplan in lockstep. Each
+original roll owns one slot per iteration holding the piece that is left of
+it: the untouched roll, the residual it was cut down to, or a small end bit.
+A roll only ever leaves behind one piece, so an (iterations x rolls) array
+holds the whole inventory of every iteration.
+
+The greedy semantics match :func:`roll_plan.engine.simulate_iteration`: the
+longest usable residual is laid first, then the shuffled regular rolls, then
+the remaining residuals from longest down.
+"""
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .engine import (
+    DEFAULT_ITERATIONS,
+    Cutplan,
+    IterationResult,
+    Roll,
+    SimulationResult,
+    simulate_iteration,
+    summarize,
+)
+from .inventory import LENGTH_SCALE, RollInventory, to_fixed
+from .stats import DEFAULT_CONFIDENCE, StoppingRule, SummaryAccumulator
+
+# Iterations advanced together; bounds memory at a few arrays of this many rows
+DEFAULT_BATCH_SIZE = 1024
+
+# Slot states
+GONE = 0       # Cut down with nothing left over
+REGULAR = 1    # Untouched original roll
+RESIDUAL = 2   # Residual long enough to be reused for later markers
+PENDING = 3    # Residual cut for the current marker, reusable from the next one
+END_BIT = 4    # Residual shorter than the smallest marker
+
+
+class BatchResult:
+    """Per-iteration results of a batch, one array element per iteration."""
+
+    def __init__(self, excess_rolls, fabric_saved_in_roll_form, usable_end_bits,
+                 unusable_bits, total_ply_shortfall, shortfall_quantity,
+                 garments_produced, end_bits_group_counts, end_bits_group_sums):
+        self.excess_rolls = excess_rolls
+        self.fabric_saved_in_roll_form = fabric_saved_in_roll_form
+        self.usable_end_bits = usable_end_bits
+        self.unusable_bits = unusable_bits
+        self.total_ply_shortfall = total_ply_shortfall
+        self.shortfall_quantity = shortfall_quantity
+        self.garments_produced = garments_produced
+        # (iterations x max_bundles)
+        self.end_bits_group_counts = end_bits_group_counts
+        self.end_bits_group_sums = end_bits_group_sums
+
+    def __len__(self):
+        return len(self.excess_rolls)
+
+    def iterations(self):
+        """The batch as a list of :class:`IterationResult`."""
+        return [
+            IterationResult(*values)
+            for values in zip(
+                self.excess_rolls.tolist(),
+                self.fabric_saved_in_roll_form.tolist(),
+                self.usable_end_bits.tolist(),
+                self.unusable_bits.tolist(),
+                self.total_ply_shortfall.tolist(),
+                self.shortfall_quantity.tolist(),
+                self.garments_produced.tolist(),
+                self.end_bits_group_counts.tolist(),
+                self.end_bits_group_sums.tolist(),
+            )
+        ]
+
+
+def _cut(lengths, state, rows, cols, plies, marker_length, smallest_marker):
+    # Lay the given plies from the pieces at (rows, cols) and leave their residuals
+    # Pieces that are gone are zeroed, so leftovers can be told by length alone
+    residual_lengths = lengths[rows, cols] - plies * marker_length
+    lengths[rows, cols] = np.where(plies == 0, 0, residual_lengths)
+    state[rows, cols] = np.where(
+        plies == 0, GONE,
+        np.where(residual_lengths >= smallest_marker, PENDING,
+                 np.where(residual_lengths > 0, END_BIT, GONE)))
+
+
+def _lay_in_order(lengths, state, rows, order, piece_state, plies_needed,
+                  marker_length, smallest_marker):
+    # Walk the pieces of each row in the given order, laying plies from every
+    # piece in piece_state until the row's plies are planned. Returns the
+    # plies laid per row.
+    row_lengths = np.take_along_axis(lengths[rows], order, axis=1)
+    row_state = np.take_along_axis(state[rows], order, axis=1)
+    plies = np.where(row_state == piece_state,
+                     row_lengths // marker_length, 0)
+    plies_before = np.cumsum(plies, axis=1) - plies
+    remaining = plies_needed[:, None] - plies_before
+
+    # A piece is cut if it yields a ply and the plies are not yet planned
+    cut = (plies > 0) & (remaining > 0)
+    plies_laid = np.where(cut, np.minimum(plies, remaining), 0)
+
+    cut_rows, cut_positions = np.nonzero(cut)
+    _cut(lengths, state, rows[cut_rows], order[cut_rows, cut_positions],
+         plies_laid[cut_rows, cut_positions], marker_length, smallest_marker)
+    return plies_laid.sum(axis=1)
+
+
+def classify_end_bit_arrays(cutplan: Cutplan, lengths, unused=None):
+    """Vectorized :func:`roll_plan.engine.classify_end_bits` over many iterations.
+
+    ``lengths`` are (iterations x pieces) in fixed point and the sums returned
+    are in units. Pieces that are not leftovers are either excluded by the
+    boolean ``unused`` mask or given length zero. Every piece falls into one
+    histogram bucket, so a single weighted ``bincount`` yields the category
+    sums and all group sums of every iteration at once.
+    """
+    longest_marker = to_fixed(cutplan.longest_marker)
+    estimated_yield_per_garment = to_fixed(cutplan.estimated_yield_per_garment)
+    max_bundles = cutplan.max_bundles
+    num_iterations = lengths.shape[0]
+
+    # Bucket 0 holds unusable bits and buckets 1 to max_bundles the usable end
+    # bits by multiples of the yield, the last group being open ended. Then
+    # come fabric in roll form and the pieces that are not leftovers.
+    roll_form_bucket = max_bundles + 1
+    num_buckets = max_bundles + 3
+    buckets = lengths // estimated_yield_per_garment
+    np.minimum(buckets, max_bundles, out=buckets)
+    buckets[lengths >= longest_marker] = roll_form_bucket
+    if unused is not None:
+        buckets[~unused] = max_bundles + 2
+    buckets += np.arange(0, num_iterations * num_buckets, num_buckets)[:, None]
+
+    buckets = buckets.ravel()
+    size = num_iterations * num_buckets
+    counts = np.bincount(buckets, minlength=size).reshape(num_iterations, num_buckets)
+    # Float sums of whole numbers are exact well past any realistic inventory
+    sums = np.bincount(buckets, weights=lengths.ravel(), minlength=size)
+    sums = np.rint(sums).astype(np.int64).reshape(num_iterations, num_buckets)
+
+    group_sums = sums[:, 1:max_bundles + 1]
+    return (sums[:, roll_form_bucket] / LENGTH_SCALE, group_sums.sum(axis=1) / LENGTH_SCALE,
+            sums[:, 0] / LENGTH_SCALE, counts[:, 1:max_bundles + 1], group_sums / LENGTH_SCALE)
+
+
+def _shuffle_keys(rng, num_iterations, num_rolls):
+    # Random sort keys ordering the regular rolls of every iteration for one marker
+    return rng.random((num_iterations, num_rolls))
+
+
+def _shuffle_window(row_state, mean_roll_length, marker_length, ply_height):
+    # Number of shuffled positions expected to cover the marker with room to
+    # spare, given how many regular rolls are left
+    num_rolls = row_state.shape[1]
+    regular_fraction = max(np.count_nonzero(row_state == REGULAR) / row_state.size, 1 / num_rolls)
+    plies_per_roll = max(mean_roll_length // marker_length, 1)
+    rolls_needed = ply_height / plies_per_roll + 4
+    return min(num_rolls, int(2 * rolls_needed / regular_fraction))
+
+
+def _shuffled_head(keys, window):
+    # The first ``window`` positions of the order given by sorting ``keys``
+    if window >= keys.shape[1]:
+        return np.argsort(keys, axis=1)
+    head = np.argpartition(keys, window, axis=1)[:, :window]
+    return np.take_along_axis(head, np.argsort(np.take_along_axis(keys, head, axis=1), axis=1), axis=1)
+
+
+def simulate_batch(cutplan: Cutplan, roll_lengths, num_iterations: int,
+                   rng: np.random.Generator) -> BatchResult:
+    """Run ``num_iterations`` random roll plans in lockstep.
+
+    Lengths are carried in fixed point (see :mod:`roll_plan.inventory`) so
+    cutting plies is exact integer arithmetic.
+    """
+    roll_lengths = np.rint(np.asarray(roll_lengths, dtype=np.float64) * LENGTH_SCALE).astype(np.int64)
+    num_rolls = len(roll_lengths)
+    marker_lengths = [to_fixed(length) for length in cutplan.marker_lengths]
+    smallest_marker = min(marker_lengths)
+    mean_roll_length = int(roll_lengths.mean()) if num_rolls else 0
+
+    lengths = np.tile(roll_lengths, (num_iterations, 1))
+    state = np.full((num_iterations, num_rolls), REGULAR, dtype=np.int8)
+    total_ply_shortfall = np.zeros(num_iterations, dtype=np.int64)
+    shortfall_quantity = np.zeros(num_iterations, dtype=np.int64)
+    garments_produced = np.zeros(num_iterations, dtype=np.int64)
+
+    for marker_length, ply_height, bundles in zip(
+            marker_lengths, cutplan.ply_heights, cutplan.bundles):
+        # Drawn for every marker so each iteration's stream is independent of
+        # which rows end up needing regular rolls
+        shuffle_keys = _shuffle_keys(rng, num_iterations, num_rolls)
+        plies_planned = np.zeros(num_iterations, dtype=np.int64)
+
+        # Rows where no piece is long enough lay nothing and fall through to
+        # the shortfall below, so no separate feasibility check is needed
+
+        # Use only the single longest usable residual first
+        usable_residuals = (state == RESIDUAL) & (lengths >= marker_length)
+        rows = np.flatnonzero(usable_residuals.any(axis=1))
+        if rows.size:
+            cols = np.where(usable_residuals[rows], lengths[rows], -1).argmax(axis=1)
+            plies = np.minimum(lengths[rows, cols] // marker_length, ply_height)
+            _cut(lengths, state, rows, cols, plies, marker_length, smallest_marker)
+            plies_planned[rows] += plies
+
+        # Then the regular rolls in shuffled order. A marker rarely needs more
+        # than a handful of rolls, so only the head of each shuffled order is
+        # walked; rows that run past it carry on over the full order.
+        rows = np.flatnonzero(plies_planned < ply_height)
+        if rows.size and num_rolls:
+            window = _shuffle_window(state[rows], mean_roll_length, marker_length, ply_height)
+            order = _shuffled_head(shuffle_keys[rows], window)
+            plies_planned[rows] += _lay_in_order(
+                lengths, state, rows, order, REGULAR, ply_height - plies_planned[rows],
+                marker_length, smallest_marker)
+
+            if window < num_rolls:
+                rows = rows[plies_planned[rows] < ply_height]
+                rows = rows[((state[rows] == REGULAR) & (lengths[rows] >= marker_length)).any(axis=1)]
+                if rows.size:
+                    order = np.argsort(shuffle_keys[rows], axis=1)
+                    plies_planned[rows] += _lay_in_order(
+                        lengths, state, rows, order, REGULAR, ply_height - plies_planned[rows],
+                        marker_length, smallest_marker)
+
+        # Then the remaining residuals, longest first
+        rows = np.flatnonzero((plies_planned < ply_height) & (state == RESIDUAL).any(axis=1))
+        if rows.size:
+            residual_lengths = np.where(state[rows] == RESIDUAL, lengths[rows], -1)
+            order = np.argsort(-residual_lengths, axis=1)
+            plies_planned[rows] += _lay_in_order(
+                lengths, state, rows, order, RESIDUAL, ply_height - plies_planned[rows],
+                marker_length, smallest_marker)
+
+        garments_produced += plies_planned * bundles
+        total_ply_shortfall += ply_height - plies_planned
+        shortfall_quantity += (ply_height - plies_planned) * bundles
+
+        # This marker's residuals become available to the next markers
+        state[state == PENDING] = RESIDUAL
+
+    # Regular rolls still have their original length
+    excess_rolls = (state == REGULAR).view(np.uint8) @ roll_lengths / LENGTH_SCALE
+
+    # Cut pieces have length zero, so every slot can be classified as it is
+    (fabric_saved_in_roll_form, usable_end_bits, unusable_bits,
+     end_bits_group_counts, end_bits_group_sums) = classify_end_bit_arrays(cutplan, lengths)
+
+    return BatchResult(excess_rolls, fabric_saved_in_roll_form, usable_end_bits, unusable_bits,
+                       total_ply_shortfall, shortfall_quantity, garments_produced,
+                       end_bits_group_counts, end_bits_group_sums)
+
+
+def batch_seeds(num_iterations: int, seed: Optional[int] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE):
+    """Split a run into batches, yielding ``(batch_iterations, seed_sequence)``.
+
+    Every batch gets its own independent seed spawned from ``seed``, so a
+    batch's results only depend on the seed and the batch's position.
+    """
+    num_batches = -(-num_iterations // batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(num_batches)
+    for batch, batch_seed in enumerate(seeds):
+        yield min(batch_size, num_iterations - batch * batch_size), batch_seed
+
+
+def batch_streams(num_iterations: int, seed: Optional[int] = None,
+                  batch_size: int = DEFAULT_BATCH_SIZE):
+    """Like :func:`batch_seeds`, with each seed turned into a generator."""
+    for batch_iterations, batch_seed in batch_seeds(num_iterations, seed, batch_size):
+        yield batch_iterations, np.random.default_rng(batch_seed)
+
+
+def run_vectorized(cutplan: Cutplan, rolls: Sequence[Roll],
+                   num_iterations: int = DEFAULT_ITERATIONS,
+                   seed: Optional[int] = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE,
+                   stopping: Optional[StoppingRule] = None,
+                   keep_iterations: bool = False) -> SimulationResult:
+    """Vectorized counterpart of :func:`roll_plan.engine.run_simulation`.
+
+    A ``stopping`` rule is checked after every batch.
+    """
+    roll_lengths = [length for _, length in rolls]
+    stats = SummaryAccumulator(cutplan.max_bundles)
+    iterations = [] if keep_iterations else None
+    stop_reason = None
+    started = time.perf_counter()
+
+    for batch_iterations, rng in batch_streams(num_iterations, seed, batch_size):
+        batch = simulate_batch(cutplan, roll_lengths, batch_iterations, rng)
+        stats.add_batch(batch)
+        if keep_iterations:
+            iterations.extend(batch.iterations())
+        if stopping is not None:
+            stop_reason = stopping.stop_reason(stats, cutplan.total_fabric_needed,
+                                               time.perf_counter() - started)
+            if stop_reason:
+                break
+    else:
+        if stopping is not None:
+            stop_reason = "max_iterations"
+
+    confidence = stopping.confidence if stopping is not None else DEFAULT_CONFIDENCE
+    summary = summarize(cutplan, rolls, stats, confidence)
+    return SimulationResult(summary, stats, iterations, stop_reason)
+
+
+def run_reference(cutplan: Cutplan, rolls: Sequence[Roll],
+                  num_iterations: int = DEFAULT_ITERATIONS,
+                  seed: Optional[int] = None,
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> SimulationResult:
+    """Run the scalar engine on the random streams of :func:`run_vectorized`.
+
+    The regular rolls of each iteration are shuffled with the same sort keys
+    the vectorized simulator draws, so for a given seed both produce the same
+    roll plans. Meant for checking the vectorized simulator on small inputs;
+    the individual iterations are always kept.
+    """
+    # Roll ids are positions in the roll list, as are the vectorized slots
+    inventory = RollInventory.from_rolls(rolls)
+    iterations = []
+    for batch_iterations, rng in batch_streams(num_iterations, seed, batch_size):
+        marker_keys = [_shuffle_keys(rng, batch_iterations, len(rolls)) for _ in range(len(cutplan))]
+        for row in range(batch_iterations):
+            def shuffle(regular_rolls, marker_index):
+                keys = marker_keys[marker_index][row]
+                regular_rolls.sort(key=keys.__getitem__)
+            iterations.append(simulate_iteration(cutplan, inventory, shuffle=shuffle))
+    stats = SummaryAccumulator.from_iterations(cutplan.max_bundles, iterations)
+    return SimulationResult(summarize(cutplan, rolls, stats), stats, iterations)
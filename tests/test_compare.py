@@ -0,0 +1,60 @@
+import pytest
+
+from roll_plan.compare import block_size, compare_cutplans, sampled_shuffle
+from roll_plan.engine import Cutplan
+from roll_plan.synthetic import SCENARIOS, generate_scenario
+
+CUTPLAN, ROLLS = generate_scenario(SCENARIOS["small-shortage"])
+
+
+def order(seed, iteration, sampling, strata=4, marker_index=0):
+    roll_ids = list(range(len(ROLLS)))
+    sampled_shuffle(seed, iteration, len(ROLLS), sampling, strata)(roll_ids, marker_index)
+    return roll_ids
+
+
+def rotations(roll_ids):
+    return [roll_ids[shift:] + roll_ids[:shift] for shift in range(len(roll_ids))]
+
+
+@pytest.mark.parametrize("sampling", ["independent", "antithetic", "stratified"])
+def test_cutplan_compared_with_itself_differs_by_nothing(sampling):
+    comparison = compare_cutplans({"a": CUTPLAN, "b": CUTPLAN}, ROLLS, 20, seed=1,
+                                  sampling=sampling)
+    [difference] = comparison.differences
+    assert difference.wastage_percentage == 0 and difference.wastage_percentage_margin == 0
+    assert difference.shortfall_quantity == 0 and difference.shortfall_quantity_margin == 0
+    assert not difference.decisive
+
+
+def test_antithetic_pairs_reverse_within_a_block_only():
+    first, second, third = (order(7, iteration, "antithetic") for iteration in range(3))
+    assert second == first[::-1]
+    assert third not in (first, second)
+
+
+def test_stratified_blocks_rotate_one_order():
+    block = [order(7, iteration, "stratified") for iteration in range(4)]
+    assert all(roll_ids in rotations(block[0]) for roll_ids in block)
+    assert len({tuple(roll_ids) for roll_ids in block}) == 4
+    assert order(7, 4, "stratified") not in rotations(block[0])
+
+
+def test_iterations_are_rounded_up_to_whole_blocks():
+    other = Cutplan.from_columns(CUTPLAN.marker_names, CUTPLAN.marker_lengths,
+                                 CUTPLAN.ply_heights[:-1] + (1,), CUTPLAN.bundles)
+    comparison = compare_cutplans({"a": CUTPLAN, "b": other}, ROLLS, 7, seed=1,
+                                  sampling="stratified", strata=4)
+    assert comparison.iterations == 8 and comparison.samples == 2
+
+
+@pytest.mark.parametrize("sampling, strata", [("stratified", 1), ("stratified", 0),
+                                              ("latin", 4), ("", 4)])
+def test_block_size_rejects_bad_sampling(sampling, strata):
+    with pytest.raises(ValueError):
+        block_size(sampling, strata)
+
+
+def test_needs_two_cutplans():
+    with pytest.raises(ValueError):
+        compare_cutplans({"a": CUTPLAN}, ROLLS, 4)
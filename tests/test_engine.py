@@ -0,0 +1,16 @@
+from roll_plan.engine import Cutplan, simulate_iteration
+
+
+def test_ply_count_is_exact_in_fixed_point():
+    # As floats 113.3 // 5.15 == 21.0, losing a ply that fits exactly
+    cutplan = Cutplan.from_columns(["M1"], [5.15], [30], [1])
+    result = simulate_iteration(cutplan, [("R1", 113.3)])
+    assert result.total_ply_shortfall == 8
+    assert result.garments_produced == 22
+    assert result.unusable_bits == 0
+
+
+def test_duplicate_roll_numbers_keep_their_own_end_bits():
+    cutplan = Cutplan.from_columns(["M1"], [5.0], [2], [1])
+    result = simulate_iteration(cutplan, [("R1", 5.5), ("R1", 5.5)])
+    assert result.unusable_bits == 1.0
@@ -0,0 +1,59 @@
+from dataclasses import replace
+
+from roll_plan.engine import Cutplan
+from roll_plan.incremental import IncrementalSimulation, dropped_rolls
+
+CUTPLAN = Cutplan.from_columns(["M1", "M2", "M3", "M4"], [4.2, 3.1, 5.15, 2.6],
+                               [6, 9, 4, 7], [2, 1, 3, 1])
+ROLLS = [(f"R{i:02d}", length) for i, length in enumerate(
+    [23.4, 41.0, 12.7, 33.3, 18.9, 27.5, 9.8, 36.1, 15.2, 30.0, 21.6, 44.4])]
+
+
+def test_update_after_dropping_rolls_matches_run():
+    simulation = IncrementalSimulation(CUTPLAN, ROLLS, num_iterations=20, seed=3)
+    simulation.run()
+    updated = simulation.update(drop_rolls=["R01", "R07"])
+    assert updated.iterations == simulation.run().iterations
+
+
+def test_dropping_a_roll_that_shares_its_number_drops_that_roll():
+    rolls = [("R1", 40.0), ("R1", 30.0), ("R2", 12.0)]
+    uploaded = [("R1", 40.0), ("R2", 12.0)]
+    simulation = IncrementalSimulation(CUTPLAN, rolls, num_iterations=5, seed=3)
+    simulation.run()
+    dropped = dropped_rolls(simulation.remaining_rolls, uploaded)
+    assert dropped == [("R1", 30.0)]
+    result = simulation.update(drop_rolls=dropped)
+    assert simulation.remaining_rolls == uploaded
+    assert result.summary.total_fabric_uploaded == 52.0
+
+
+def test_update_after_cutplan_edit_matches_fresh_run():
+    edited = replace(CUTPLAN, ply_heights=(6, 9, 2, 7))
+    simulation = IncrementalSimulation(CUTPLAN, ROLLS, num_iterations=20, seed=3)
+    simulation.run()
+    updated = simulation.update(edited)
+    fresh = IncrementalSimulation(edited, ROLLS, num_iterations=20, seed=3).run()
+    assert updated.iterations == fresh.iterations
+    assert updated.summary == fresh.summary
+
+
+def test_updates_match_fresh_runs_when_only_some_checkpoints_fit():
+    full = IncrementalSimulation(CUTPLAN, ROLLS, num_iterations=20, seed=5)
+    full.run()
+    trace_bytes = max(trace.nbytes for trace in full._traces.values())
+    # Room for the checkpoints of a few iterations; the rest are re-run from
+    # the first marker
+    simulation = IncrementalSimulation(CUTPLAN, ROLLS, num_iterations=20, seed=5,
+                                       memory_limit=4 * trace_bytes)
+    simulation.run()
+    assert 0 < len(simulation._traces) < 20
+    cutplan = CUTPLAN
+    for marker_index, plies in ((3, 2), (1, 12), (2, 3)):
+        ply_heights = list(cutplan.ply_heights)
+        ply_heights[marker_index] = plies
+        cutplan = replace(cutplan, ply_heights=tuple(ply_heights))
+        updated = simulation.update(cutplan)
+        assert simulation.markers_simulated < 20 * len(cutplan)
+        fresh = IncrementalSimulation(cutplan, ROLLS, num_iterations=20, seed=5).run()
+        assert updated.iterations == fresh.iterations
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from roll_plan.ingest import CutplanError, _write_disk_cache, frames_to_inputs
+
+ROLLS = pd.DataFrame({"Roll_Number": ["R1", "R2"], "Roll_Length": [40.0, 35.5]})
+
+
+def rolls(lengths=(40.0, 35.5), numbers=("R1", "R2")):
+    return pd.DataFrame({"Roll_Number": list(numbers), "Roll_Length": list(lengths)})
+
+
+def cutplan(lengths=(4.2, 3.1), plies=(5, 3), bundles=(2, 1)):
+    return pd.DataFrame({"Marker_Name": [f"M{i}" for i in range(len(lengths))],
+                         "Marker_Length": list(lengths), "Ply_Height": list(plies),
+                         "Bundles": list(bundles)})
+
+
+@pytest.mark.parametrize("cutplan_df", [
+    cutplan((), (), ()),
+    cutplan(plies=(0, 0)),
+    cutplan(lengths=(4.2, 0)),
+    cutplan(lengths=(4.2, -1.0)),
+])
+def test_rejects_cutplans_that_cannot_be_planned(cutplan_df):
+    with pytest.raises(CutplanError):
+        frames_to_inputs(cutplan_df, ROLLS)
+
+
+@pytest.mark.parametrize("cutplan_df, rolls_df", [
+    (cutplan(plies=(5, None)), ROLLS),
+    (cutplan(plies=(5, "five")), ROLLS),
+    (cutplan(bundles=(2, None)), ROLLS),
+    (cutplan(), rolls(lengths=(40.0, None))),
+    (cutplan(), rolls(lengths=(40.0, "n/a"))),
+    (cutplan(), rolls(lengths=(40.0, -3.0))),
+])
+def test_rejects_blank_or_non_numeric_cells(cutplan_df, rolls_df):
+    with pytest.raises(CutplanError):
+        frames_to_inputs(cutplan_df, rolls_df)
+
+
+def test_accepts_numbers_typed_as_text():
+    plan, roll_list = frames_to_inputs(cutplan(plies=("5.0", "3")), rolls(lengths=("40", 35.5)))
+    assert plan.ply_heights == (5, 3)
+    assert roll_list == (("R1", 40.0), ("R2", 35.5))
+
+
+def test_failed_disk_cache_write_leaves_no_files(tmp_path):
+    pytest.importorskip("pyarrow")
+    # Roll numbers that are partly numbers and partly text do not convert to Parquet
+    frames = (cutplan(), rolls(numbers=(101, "R2")))
+    with pytest.warns(UserWarning):
+        _write_disk_cache(tmp_path, "key", frames)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_accepts_valid_cutplan():
+    plan, rolls = frames_to_inputs(cutplan(), ROLLS)
+    assert len(plan) == 2 and len(rolls) == 2
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from roll_plan.parallel import run_parallel  # noqa: E402
+from roll_plan.stats import StoppingRule  # noqa: E402
+from roll_plan.synthetic import SCENARIOS, generate_scenario  # noqa: E402
+
+CUTPLAN, ROLLS = generate_scenario(SCENARIOS["small-shortage"])
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+@pytest.mark.parametrize("stopping", [None, StoppingRule(wastage_tolerance=0.5, min_iterations=20)])
+def test_results_do_not_depend_on_the_number_of_workers(vectorized, stopping):
+    batch_size = 8 if vectorized else 4
+    runs = [run_parallel(CUTPLAN, ROLLS, 96, seed=11, workers=workers, vectorized=vectorized,
+                         batch_size=batch_size, stopping=stopping)
+            for workers in (1, 3)]
+    assert runs[0].summary == runs[1].summary
+    assert runs[0].stats.describe() == runs[1].stats.describe()
+    assert runs[0].stop_reason == runs[1].stop_reason
@@ -0,0 +1,31 @@
+import pytest
+
+from roll_plan.solver import plan_cost, solve
+from roll_plan.synthetic import SCENARIOS, generate_scenario
+
+
+@pytest.mark.parametrize("scenario", ["small-surplus", "small-shortage"])
+@pytest.mark.parametrize("seed", range(3))
+def test_search_never_ends_worse_than_it_started(scenario, seed):
+    cutplan, rolls = generate_scenario(SCENARIOS[scenario])
+    solution = solve(cutplan, rolls, time_budget=60, seed=seed, max_evaluations=200)
+    assert plan_cost(solution.result) <= plan_cost(solution.seed_result)
+
+
+@pytest.mark.parametrize("scenario", ["small-surplus", "small-shortage"])
+def test_plan_table_plies_add_up_to_the_shortfall(scenario):
+    cutplan, rolls = generate_scenario(SCENARIOS[scenario])
+    solution = solve(cutplan, rolls, time_budget=60, seed=0, max_evaluations=100)
+    table = solution.plan_table()
+    assert [row["Marker"] for row in table] == list(cutplan.marker_names)
+    ply_shortfalls = [row["Plies Planned"] - row["Plies Laid"] for row in table]
+    assert sum(ply_shortfalls) == solution.result.total_ply_shortfall
+    assert (sum(shortfall * bundles for shortfall, bundles in zip(ply_shortfalls, cutplan.bundles))
+            == solution.result.shortfall_quantity)
+
+
+def test_stop_hook_ends_the_search():
+    cutplan, rolls = generate_scenario(SCENARIOS["small-shortage"])
+    solution = solve(cutplan, rolls, time_budget=60, seed=0,
+                     stop=lambda evaluations, elapsed: evaluations >= 10)
+    assert solution.evaluations == 10
@@ -0,0 +1,68 @@
+import pickle
+import random
+
+import pytest
+
+from roll_plan.engine import IterationResult
+from roll_plan.stats import RunningStat, StoppingRule, SummaryAccumulator
+
+VALUES = [round(random.Random(4).uniform(0, 50), 3) for _ in range(1500)]
+
+
+def sequential(values):
+    stat = RunningStat(1000)
+    for value in values:
+        stat.add(value)
+    return stat
+
+
+def assert_same_moments(stat, expected):
+    assert stat.count == expected.count
+    assert stat.mean == expected.mean
+    assert stat.variance == pytest.approx(expected.variance, rel=1e-12)
+    assert (stat.minimum, stat.maximum) == (expected.minimum, expected.maximum)
+
+
+def test_merged_batches_match_sequential_adds():
+    expected = sequential(VALUES)
+    merged = RunningStat(1000)
+    for start in range(0, len(VALUES), 400):
+        # Through pickle, as batches come back from worker processes
+        merged.merge(pickle.loads(pickle.dumps(sequential(VALUES[start:start + 400]))))
+    assert_same_moments(merged, expected)
+
+
+def test_add_many_matches_sequential_adds():
+    stat = RunningStat(1000)
+    stat.add_many(VALUES[:700])
+    stat.add_many(VALUES[700:])
+    assert_same_moments(stat, sequential(VALUES))
+
+
+def test_add_many_of_an_array_matches_sequential_adds():
+    np = pytest.importorskip("numpy")
+    stat = RunningStat(1000)
+    stat.add_many(np.array(VALUES[:700]))
+    stat.add_many(np.array(VALUES[700:]))
+    assert_same_moments(stat, sequential(VALUES))
+
+
+def accumulator(wastages, shortfalls):
+    stats = SummaryAccumulator(1)
+    for wastage, shortfall in zip(wastages, shortfalls):
+        stats.add(IterationResult(0.0, 0.0, wastage, 0.0, shortfall, shortfall, 0, [0], [0.0]))
+    return stats
+
+
+def test_stopping_rule_reasons():
+    steady = accumulator([2.0] * 12, [5] * 12)
+    noisy = accumulator([1.0, 9.0] * 6, [0, 40] * 6)
+    rule = StoppingRule(wastage_tolerance=0.1, shortfall_tolerance=1.0, min_iterations=10)
+    assert rule.stop_reason(steady, 100.0, 0.0) == "converged"
+    assert rule.stop_reason(noisy, 100.0, 0.0) is None
+    assert rule.stop_reason(accumulator([2.0] * 5, [5] * 5), 100.0, 0.0) is None
+    assert StoppingRule(time_budget=1.0).stop_reason(noisy, 100.0, 1.5) == "time_budget"
+    assert StoppingRule().stop_reason(steady, 100.0, 0.0) is None
+    # Only the tolerances that are set have to be met
+    assert StoppingRule(shortfall_tolerance=1.0).stop_reason(
+        accumulator([1.0, 9.0] * 6, [5] * 12), 100.0, 0.0) == "converged"
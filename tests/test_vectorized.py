@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from roll_plan.engine import Cutplan  # noqa: E402
+from roll_plan.vectorized import run_reference, run_vectorized  # noqa: E402
+
+
+def random_inputs(seed):
+    rng = random.Random(seed)
+    num_markers = rng.randint(1, 8)
+    cutplan = Cutplan.from_columns(
+        [f"M{i}" for i in range(num_markers)],
+        [round(rng.uniform(1, 12), rng.choice([0, 1, 2, 3])) or 1 for _ in range(num_markers)],
+        [rng.randint(1, 30) for _ in range(num_markers)],
+        [rng.randint(1, 6) for _ in range(num_markers)])
+    longest_roll = rng.choice([15, 40, 120])
+    rolls = [(f"R{i}", round(rng.uniform(0.5, longest_roll), 3))
+             for i in range(rng.randint(1, 60))]
+    return cutplan, rolls
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_vectorized_matches_reference_iteration_by_iteration(seed):
+    cutplan, rolls = random_inputs(seed)
+    vectorized = run_vectorized(cutplan, rolls, 40, seed, batch_size=16, keep_iterations=True)
+    reference = run_reference(cutplan, rolls, 40, seed, batch_size=16)
+    assert vectorized.iterations == reference.iterations
+    assert vectorized.summary == reference.summary